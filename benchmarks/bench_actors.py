@@ -0,0 +1,218 @@
+"""
+bench_actors.py
+
+Times every FrontMatterActor mode over synthetic vaults of increasing
+size. Each mode runs in a fresh child process on its own copy of the
+vault, and reports the time spent in each phase (discover, read, parse,
+act, write), the end-to-end run time, throughput and peak RSS. For each
+size it also compares the memory held by the vault's parsed properties
+as per-instance dict objects and as slotted FrontMatterProperty objects.
+Results are saved as JSON, and can be compared against an earlier
+results file.
+
+Usage: python benchmarks/bench_actors.py [--sizes 1000,10000,100000]
+       [--output bench_results.json] [--compare earlier.json]
+"""
+import argparse
+import copy
+import json
+import pathlib
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / "core"), str(ROOT), str(ROOT / "benchmarks")]
+
+from fmActor import create_actor, create_batch_actor
+from fmFile import FrontMatterFile
+from fmWalker import FrontMatterWalker
+from vaultgen import VaultSettings, generate_vault
+import constants as S
+
+MODES = (
+    (S.MODE_ADD, "benchmark: added"),
+    (S.MODE_SET, "status: done"),
+    (S.MODE_CHANGE, "type: changed"),
+    (S.MODE_REMOVE, "area: x"),
+    (S.MODE_TOTAL, S.FAKE_PROPERTY),
+    (S.MODE_BATCH, None),
+)
+BATCH_OPERATIONS = ((S.MODE_ADD, "benchmark: added"), (S.MODE_SET, "status: done"), (S.MODE_REMOVE, "area: x"))
+
+
+def build_actor(directory, mode, property_text):
+    if mode == S.MODE_BATCH:
+        return create_batch_actor(directory, BATCH_OPERATIONS, use_index=False)
+    return create_actor(directory, property_text, mode, use_index=False)
+
+
+def time_phases(directory, mode, property_text):
+    # Drives the pipeline stages by hand so each one can be timed on its own.
+    phases = dict.fromkeys(("discover", "read", "parse", "act", "write"), 0.0)
+    parse = FrontMatterFile.find_properties
+
+    def timed_parse(file):
+        started = time.perf_counter()
+        parse(file)
+        phases["parse"] += time.perf_counter() - started
+
+    FrontMatterFile.find_properties = timed_parse
+    try:
+        actor = build_actor(directory, mode, property_text)
+        started = time.perf_counter()
+        file_paths = list(FrontMatterWalker(directory))
+        phases["discover"] = time.perf_counter() - started
+        for file_path in file_paths:
+            started = time.perf_counter()
+            file = FrontMatterFile(file_path)
+            file.read()
+            phases["read"] += time.perf_counter() - started
+            started = time.perf_counter()
+            actor.action(file)
+            phases["act"] += time.perf_counter() - started
+            started = time.perf_counter()
+            if file.modified:
+                file.write()
+            phases["write"] += time.perf_counter() - started
+    finally:
+        FrontMatterFile.find_properties = parse
+    phases["read"] -= phases["parse"]
+    return phases, len(file_paths)
+
+
+def measure_mode(source, mode, property_text):
+    # Runs in its own process, so the peak RSS belongs to this mode alone.
+    with tempfile.TemporaryDirectory() as scratch:
+        phased = pathlib.Path(scratch) / "phased"
+        whole = pathlib.Path(scratch) / "whole"
+        shutil.copytree(source, phased)
+        shutil.copytree(source, whole)
+        phases, notes = time_phases(phased, mode, property_text)
+        actor = build_actor(whole, mode, property_text)
+        started = time.perf_counter()
+        actor.run()
+        run_seconds = time.perf_counter() - started
+    return {
+        "mode": mode,
+        "notes": notes,
+        "run_seconds": run_seconds,
+        "notes_per_second": notes / run_seconds if run_seconds else None,
+        "affected": len(actor.affected),
+        "phases": phases,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+class DictProperty:
+    # The earlier property layout: text, key and value in a per-instance __dict__.
+
+    def __init__(self, prop_item):
+        self.text = prop_item.as_line()
+        self.key = prop_item.key
+        self.value = prop_item.value
+
+
+def traced(build):
+    tracemalloc.start()
+    try:
+        kept = build()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del kept
+    return size
+
+
+def measure_memory(source):
+    # Runs in its own process. Each layout is built from already parsed
+    # notes, so only the memory held by the layout itself is counted.
+    files = list(())
+    for file_path in FrontMatterWalker(source):
+        file = FrontMatterFile(file_path)
+        file.read()
+        files.append((file.name, [prop_item for prop_item in file.properties.values() if prop_item.key is not None]))
+
+    def as_dicts():
+        return [[DictProperty(prop_item) for prop_item in properties] for name, properties in files]
+
+    def as_slots():
+        return [[copy.copy(prop_item) for prop_item in properties] for name, properties in files]
+    return {"dict_bytes": traced(as_dicts), "slots_bytes": traced(as_slots)}
+
+
+def run_size(notes, settings):
+    results = list(())
+    with tempfile.TemporaryDirectory() as scratch:
+        settings.notes = notes
+        vault = generate_vault(pathlib.Path(scratch) / "vault", settings)
+        for mode, property_text in MODES:
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                result = pool.submit(measure_mode, vault, mode, property_text).result()
+            results.append(result)
+            print("{0:>8} {1:>7} {2:>9.3f}s {3:>11.0f}/s {4:>9}KB  {5}".format(
+                notes, mode, result["run_seconds"], result["notes_per_second"] or 0, result["peak_rss_kb"],
+                " ".join("{0}={1:.3f}".format(phase, seconds) for phase, seconds in result["phases"].items())))
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            memory = pool.submit(measure_memory, vault).result()
+        memory["notes"] = notes
+        print("{0:>8}  memory   dict {1:>10,}B  slots {2:>10,}B ({3:.2f}x)".format(
+            notes, memory["dict_bytes"], memory["slots_bytes"], memory["slots_bytes"] / memory["dict_bytes"]))
+    return results, memory
+
+
+def compare(results, earlier_path):
+    earlier = json.loads(pathlib.Path(earlier_path).read_text())
+    before = dict(((result["notes"], result["mode"]), result) for result in earlier["results"])
+    print("\nCompared with {0}:".format(earlier_path))
+    for result in results:
+        previous = before.get((result["notes"], result["mode"]))
+        if previous and previous["run_seconds"]:
+            print("{0:>8} {1:>7} {2:>7.2f}x time {3:>7.2f}x rss".format(
+                result["notes"], result["mode"], result["run_seconds"] / previous["run_seconds"],
+                result["peak_rss_kb"] / previous["peak_rss_kb"]))
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(description="Benchmark every FrontMatterActor mode on synthetic vaults.")
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--body-lines", type=int, default=20)
+    parser.add_argument("--properties", type=int, default=5)
+    parser.add_argument("--missing-share", type=float, default=0.1)
+    parser.add_argument("--link-share", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare")
+    options = parser.parse_args(arguments[1:])
+    settings = VaultSettings(depth=options.depth, body_lines=options.body_lines, properties=options.properties,
+                             missing_share=options.missing_share, link_share=options.link_share, seed=options.seed)
+
+    print("{0:>8} {1:>7} {2:>10} {3:>12} {4:>11}  phases".format("notes", "mode", "run", "throughput", "peak rss"))
+    results = list(())
+    memory = list(())
+    for notes in [int(size) for size in options.sizes.split(",")]:
+        size_results, size_memory = run_size(notes, settings)
+        results.extend(size_results)
+        memory.append(size_memory)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": settings.as_dict(),
+        "results": results,
+        "memory": memory,
+    }
+    pathlib.Path(options.output).write_text(json.dumps(report, indent=2))
+    if options.compare:
+        compare(results, options.compare)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,54 @@
+"""
+bench_set_properties.py
+
+Times FrontMatterFile write-back for notes that differ only in body
+length, to show that rebuilding the header does not depend on it.
+
+Usage: python benchmarks/bench_set_properties.py [repeats]
+"""
+import pathlib
+import sys
+import tempfile
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / "core"), str(ROOT)]
+
+from fmFile import FrontMatterFile
+from fmProperty import FrontMatterProperty
+
+BODY_LINES = (10, 1000, 100000)
+HEADER = "---\ntags: a\nstatus: open\ncreated: 2024-01-01\n---\n"
+BODY_LINE = "Some body text with a --- rule and a [[Link]] in it.\n"
+
+
+def time_note(note_path, repeats):
+    set_seconds = 0.0
+    write_seconds = 0.0
+    for index in range(repeats):
+        file = FrontMatterFile(note_path)
+        file.read()
+        file.set_property_value_or_add(FrontMatterProperty("run: {0}".format(index)))
+        file.remove_property(FrontMatterProperty("status: x"))
+        started = time.perf_counter()
+        file.set_properties()
+        set_seconds += time.perf_counter() - started
+        started = time.perf_counter()
+        file.write()
+        write_seconds += time.perf_counter() - started
+    return set_seconds / repeats, write_seconds / repeats
+
+
+def main(arguments):
+    repeats = int(arguments[1]) if len(arguments) > 1 else 50
+    print("{0:>12} {1:>16} {2:>16}".format("body lines", "set_properties", "write"))
+    with tempfile.TemporaryDirectory() as directory:
+        for body_lines in BODY_LINES:
+            note_path = pathlib.Path(directory) / "note{0}.md".format(body_lines)
+            note_path.write_text(HEADER + BODY_LINE * body_lines)
+            set_seconds, write_seconds = time_note(note_path, repeats)
+            print("{0:>12} {1:>14.1f}us {2:>14.1f}us".format(body_lines, set_seconds * 1e6, write_seconds * 1e6))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,101 @@
+"""
+bench_startup.py
+
+Measures the cold start of a one-shot propertyfiller.py command (SET
+on a small vault) with python -X importtime, and fails if the median
+import time goes over a budget, or if the one-shot path imports any
+module that only the interactive menu, WATCH, SERVE, UNDO or --jobs need.
+
+Usage: python benchmarks/bench_startup.py [--runs 9] [--budget-ms 75]
+       [--notes 20] [--script propertyfiller.py]
+"""
+import argparse
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / "benchmarks")]
+
+from vaultgen import VaultSettings, generate_vault
+
+# Modules the one-shot path must never load.
+FORBIDDEN = ("readline", "interface.wcTerminalIO", "multiprocessing", "concurrent.futures", "socketserver", "ctypes")
+
+
+def parse_importtime(stderr):
+    """
+    :return: (total import microseconds, the set of imported module names),
+    where the total adds up the cumulative time of each top-level import
+    """
+    total = 0
+    modules = set(())
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_time, cumulative, name = line[len("import time:"):].split("|")
+        modules.add(name.strip())
+        if not name[1:].startswith(" "):
+            total += int(cumulative)
+    return total, modules
+
+
+def measure(script, vault, runs):
+    # The first run is not counted: it writes the bytecode caches, so the
+    # rest measure the start-up a user sees on every later call.
+    environment = dict(os.environ)
+    environment.pop("PYTHONDONTWRITEBYTECODE", None)
+    import_times = list(())
+    wall_times = list(())
+    modules = set(())
+    for run in range(runs + 1):
+        started = time.perf_counter()
+        finished = subprocess.run([sys.executable, "-X", "importtime", str(script), "SET",
+                                   "benchmark: {0}".format(run), vault.name],
+                                  cwd=vault.parent, env=environment, capture_output=True, text=True)
+        wall = time.perf_counter() - started
+        if finished.returncode:
+            raise RuntimeError(finished.stderr)
+        if not run:
+            continue
+        wall_times.append(wall)
+        total, imported = parse_importtime(finished.stderr)
+        import_times.append(total / 1000)
+        modules |= imported
+    return import_times, wall_times, modules
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(description="Check propertyfiller.py's one-shot start-up against a budget.")
+    parser.add_argument("--runs", type=int, default=9)
+    parser.add_argument("--budget-ms", type=float, default=75.0)
+    parser.add_argument("--notes", type=int, default=20)
+    parser.add_argument("--script", default=str(ROOT / "propertyfiller.py"))
+    options = parser.parse_args(arguments[1:])
+
+    with tempfile.TemporaryDirectory() as scratch:
+        vault = generate_vault(pathlib.Path(scratch) / "vault", VaultSettings(notes=options.notes))
+        import_times, wall_times, modules = measure(pathlib.Path(options.script).resolve(), vault, options.runs)
+
+    import_ms = statistics.median(import_times)
+    print("imports: median {0:.1f}ms  min {1:.1f}ms  max {2:.1f}ms  (budget {3:.1f}ms)".format(
+        import_ms, min(import_times), max(import_times), options.budget_ms))
+    print("process: median {0:.1f}ms  min {1:.1f}ms".format(
+        statistics.median(wall_times) * 1000, min(wall_times) * 1000))
+    failures = list(())
+    loaded = sorted(module for module in FORBIDDEN if module in modules)
+    if loaded:
+        failures.append("the one-shot path imports " + ", ".join(loaded))
+    if import_ms > options.budget_ms:
+        failures.append("imports take {0:.1f}ms, over the {1:.1f}ms budget".format(import_ms, options.budget_ms))
+    for failure in failures:
+        print("FAIL: " + failure)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,77 @@
+"""
+vaultgen.py
+
+Builds deterministic synthetic Obsidian vaults for the benchmarks. The
+same settings and seed always give byte-identical vaults.
+
+Usage: python benchmarks/vaultgen.py [directory] [notes]
+"""
+import os
+import pathlib
+import random
+import sys
+
+KEY_POOL = ("tags", "status", "type", "created", "area", "project", "source", "rating", "aliases", "related")
+VALUE_POOL = ("open", "done", "draft", "task", "idea", "2024-01-01", "3", "reading", "work", "home")
+WORD_POOL = ("lorem", "ipsum", "dolor", "sit", "amet", "vault", "note", "link", "---", "|", "table", "[[Other]]")
+
+
+class VaultSettings:
+    def __init__(self, notes=1000, depth=3, fanout=4, body_lines=20, properties=5, missing_share=0.1, link_share=0.2, seed=0):
+        self.notes = notes
+        self.depth = depth
+        self.fanout = fanout
+        self.body_lines = body_lines
+        self.properties = properties
+        self.missing_share = missing_share
+        self.link_share = link_share
+        self.seed = seed
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+
+def note_folder(chooser, settings):
+    parts = ["folder{0}".format(chooser.randrange(settings.fanout)) for _ in range(chooser.randint(0, settings.depth))]
+    return pathlib.Path(*parts) if parts else pathlib.Path()
+
+
+def note_text(chooser, settings, index):
+    lines = list(())
+    if chooser.random() >= settings.missing_share:
+        lines.append("---\n")
+        count = min(settings.properties, len(KEY_POOL))
+        keys = chooser.sample(KEY_POOL, count) + ["field{0}".format(extra) for extra in range(settings.properties - count)]
+        for key in keys:
+            if chooser.random() < settings.link_share:
+                value = "[[Note {0}]]".format(chooser.randrange(settings.notes))
+            else:
+                value = chooser.choice(VALUE_POOL)
+            lines.append("{0}: {1}\n".format(key, value))
+        lines.append("---\n")
+    lines.append("# Note {0}\n".format(index))
+    for _ in range(settings.body_lines):
+        lines.append(" ".join(chooser.choice(WORD_POOL) for _ in range(10)) + "\n")
+    return "".join(lines)
+
+
+def generate_vault(directory, settings):
+    """
+    Writes settings.notes markdown files under directory, spread over
+    folders up to settings.depth deep.
+    :return: The vault's root path
+    """
+    root = pathlib.Path(directory)
+    chooser = random.Random(settings.seed)
+    for index in range(settings.notes):
+        folder = root / note_folder(chooser, settings)
+        os.makedirs(folder, exist_ok=True)
+        with open(folder / "note{0}.md".format(index), "w") as note:
+            note.write(note_text(chooser, settings, index))
+    return root
+
+
+if __name__ == "__main__":
+    arguments = sys.argv
+    generate_vault(arguments[1] if len(arguments) > 1 else "synthetic_vault",
+                   VaultSettings(notes=int(arguments[2]) if len(arguments) > 2 else 1000))
@@ -2,46 +2,125 @@
 
 EMPTY = ""
 NL = "\n"
+CRLF = "\r\n"
 COLON = ":"
 FORWARDSLASH = "/"
 BACKSLASH = "\\"
 MD = ".md"
+HIDDEN = "."
 FM = "---"
 FM_LINE = "---\n"
+ENCODING = "utf-8"
+TEMP_SUFFIX = ".tmp"
 
 FRAME_PLAIN_ACTION = "{2}: {0} {1}"
 FRAME_PROPERTIES_IN = "Properties seen in {0}: "
 FRAME_PROPERTY = "{0}: {1}"
 FRAME_SUMMARY_HEADER = "{0} files affected"
 FRAME_SUMMARY_ITEM = "- {0}\n"
+FRAME_UNDO_SUMMARY = "{0} files restored, {1} refused as changed since the run\n"
+FRAME_TOTAL_VALUE = "  - {0}: {1}\n"
+FRAME_TOTAL_FILES = "  files: {0}\n"
+FRAME_BATCH_OPERATION = "{0} {1}: {2}"
+BATCH_COMMENT = "#"
 
 MODE_ADD = "ADD"
 MODE_SET = "SET"
 MODE_CHANGE = "CHANGE"
 MODE_REMOVE = "REMOVE"
 MODE_TOTAL = "TOTAL"
+MODE_BATCH = "BATCH"
+MODE_RENAME = "RENAME"
+MODE_WATCH = "WATCH"
+MODE_UNDO = "UNDO"
+MODE_SERVE = "SERVE"
 MODE_HELP = "HELP"
 MODE_MENU = "MENU"
 
+OPTION_JOBS = "--jobs"
+OPTION_STATS = "--stats"
+OPTION_SOCKET = "--socket"
+OPTION_MMAP = "--mmap-above"
+FILTER_WHERE = "WHERE"
+FILTER_AND = "AND"
+FILTER_OR = "OR"
+FILTER_NOT = "NOT"
+PROGRESS_WIDTH = 60
+OPTION_TOP = "--top"
+OPTION_KEYS = "--keys"
+OPTION_FILES = "--files"
+OPTION_MERGE = "--merge"
+OPTION_RESUME = "--resume"
+OPTION_NO_UNDO = "--no-undo"
+OPTION_FORMAT = "--format"
+OPTION_LIST_SEPARATOR = ","
+
+FORMAT_TEXT = "text"
+FORMAT_JSON = "json"
+FORMAT_CSV = "csv"
+
 MENU_CHOICE_INVALID = -1
 MENU_CHOICE_ADD = 0
 MENU_CHOICE_SET = 1
 MENU_CHOICE_CHANGE = 2
 MENU_CHOICE_REMOVE = 3
 MENU_CHOICE_TOTAL = 4
-MENU_CHOICE_DIR_SET = 5
-MENU_CHOICE_DIR_CLEAR = 6
-MENU_CHOICE_QUIT = 7
+MENU_CHOICE_RENAME = 5
+MENU_CHOICE_DIR_SET = 6
+MENU_CHOICE_DIR_CLEAR = 7
+MENU_CHOICE_QUIT = 8
 
 USE_WORKING = "."
+WALK_WORKERS = 8
+MMAP_THRESHOLD = 1 << 20
+MMAP_PEEK = 4096
+JOB_CHUNK_SIZE = 64
+
+PHASE_DISCOVER = "discover"
+PHASE_INDEX = "index"
+PHASE_READ = "read"
+PHASE_PARSE = "parse"
+PHASE_NORMALISE = "normalise"
+PHASE_ACT = "act"
+PHASE_WRITE = "write"
+COUNT_DISCOVERED = "files_discovered"
+COUNT_SCANNED = "files_scanned"
+COUNT_CHANGED = "files_changed"
+COUNT_SKIPPED = "files_skipped"
+COUNT_RESUMED = "files_resumed"
+COUNT_BYTES_READ = "bytes_read"
+COUNT_BYTES_WRITTEN = "bytes_written"
+INDEX_NAME = ".frontmatter-index.sqlite"
+JOURNAL_NAME = ".frontmatter-journal.jsonl"
+UNDO_FOLDER = ".frontmatter-undo"
+UNDO_SUFFIX = ".jsonl"
+UNDO_NAME_FORMAT = "%Y%m%dT%H%M%S%f"
+UNDO_WORKERS = 8
+UNDO_KEEP = 10
+WATCH_SOCKET = ".frontmatter-watch.sock"
+WATCH_POLL_INTERVAL = 2.0
+WATCH_BUFFER = 65536
+INDEX_CREATE = "CREATE TABLE IF NOT EXISTS notes (path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, properties TEXT)"
+INDEX_SELECT = "SELECT path, mtime_ns, size, properties FROM notes"
+INDEX_UPSERT = "INSERT OR REPLACE INTO notes (path, mtime_ns, size, properties) VALUES (?, ?, ?, ?)"
+INDEX_DELETE = "DELETE FROM notes WHERE path = ?"
 FAKE_PROPERTY = "A: B"
 DIRECTORY_NONE = "No Working Directory"
 DIRECTORY_CHANGED = "Working Directory: {0}"
 
 
-ERROR_NOT_ENOUGH_ARGUMENTS = "Incorrect Arguments: You have not given us enough arguments. Correct syntax: [ADD/SET/CHANGE/REMOVE/TOTAL] [Key]:[Value] [Root Folder Path (Optional)]"
-ERROR_INVALID_COMMAND = "Invalid Command: Our command choices are ADD, SET, CHANGE, REMOVE, or TOTAL."
+ERROR_NOT_ENOUGH_ARGUMENTS = "Incorrect Arguments: You have not given us enough arguments. Correct syntax: [ADD/SET/CHANGE/REMOVE/TOTAL/RENAME] [Key]:[Value] [Root Folder Path (Optional)]"
+ERROR_INVALID_COMMAND = "Invalid Command: Our command choices are ADD, SET, CHANGE, REMOVE, TOTAL, RENAME, or BATCH."
 ERROR_INVALID_PROPERTY = "Incorrect Property: Please provide the property, in form \"[KEY]:[VALUE\", as the first argument,and a directory path as the optional second argument."
+ERROR_INVALID_BATCH = "Invalid Batch: Give BATCH one or more [ADD/SET/CHANGE/REMOVE/RENAME] [Key]:[Value] pairs, or a file with one such operation per line, then an optional directory."
+ERROR_INVALID_BATCH_COMMAND = "Invalid Batch Command: {0} cannot be used in a batch. Batches accept ADD, SET, CHANGE, REMOVE, or RENAME."
+ERROR_INVALID_OPTION = "Invalid Option: {0} was given \"{1}\", which it cannot use."
+ERROR_INVALID_RENAME = "Invalid Rename: Give RENAME the old and new keys as [Old_key]:[New_key]."
+ERROR_RESUME_MISMATCH = "Cannot Resume: The journal at {0} was left by a different operation. Run it again without --resume to start over."
+ERROR_UNDO_NONE = "Nothing to Undo: There is no undo log in {0}."
+ERROR_INVALID_FILTER = "Invalid Filter: We could not read the WHERE clause \"{0}\"."
+ERROR_WATCH_RUNNING = "Watch Running: A daemon is already answering at {0}."
+ERROR_WATCH_DIRECTORY = "Wrong Directory: This daemon watches {1}, not {0}."
 ERROR_INVALID_DIRECTORY = "Invalid Directory: The path you passed did not resolve to a valid directory."
 
 SCREEN_HELP_HEADER = "Welcome!"
@@ -52,7 +131,35 @@ Modes:
 - CHANGE: Sets the value of a property, but only if it already exists.
 - REMOVE: Removes a property from all files.
 - TOTAL: Collects all properties mentioned in these files.
+- RENAME: Renames a key, as RENAME date:created, keeping its values and its place.
+  Notes that already have the new key are skipped, unless --merge adds the old values to it.
+- BATCH: Runs several ADD/SET/CHANGE/REMOVE/RENAME operations in one pass.
+- UNDO: Restores the headers changed by the last edit run, leaving notes edited since alone.
+  Each edit run saves its undo log in .frontmatter-undo in the directory; the newest 10 are kept.
+- SERVE: Answers JSON-lines commands for any directory from one process, for scripts.
+- WATCH: Keeps a directory's properties in memory and answers the other modes from it.
 Syntax: [MODE] [Property_key]:[Property_value] [OPTIONAL directory_path]
+Batch Syntax: BATCH [MODE] [Property_key]:[Property_value] ... [OPTIONAL directory_path]
+Or: BATCH [operations_file] [OPTIONAL directory_path]
+Add WHERE [filter] to the end of any mode to touch only matching notes, as in
+SET status:done WHERE type:task AND status:open. Filters test a key (tags),
+a value (status:open, title:"in progress", tags:proj*, status!=done) or a
+comparison (rating>=3, created<2024-01-01), joined with AND, OR, NOT and ( ).
+Undo Syntax: UNDO [OPTIONAL directory_path]
+Serve Syntax: SERVE [OPTIONAL directory_path]
+SERVE answers JSON commands, one per line, such as {"mode": "SET", "property": "k:v", "dir": "notes"},
+from stdin (or from --socket PATH) with one JSON result per line, keeping each vault warm.
+Watch Syntax: WATCH [OPTIONAL directory_path]
+While WATCH runs, the other modes on that directory are sent to it.
+Options: --jobs N runs the edits across N worker processes.
+--stats prints where the run spent its time, or --stats=FILE saves it as JSON.
+--resume finishes an interrupted run of the same operation, skipping the notes it already did.
+--no-undo edits without saving an undo log, so the run cannot be undone.
+--mmap-above BYTES reads notes of at least that size through a memory map (default: 1 MiB).
+--socket PATH picks the socket WATCH listens on (default: .frontmatter-watch.sock in the directory).
+TOTAL options: --top N shows only the N most common values of each property,
+--keys a,b* limits the totals to matching keys, --files lists the files for
+each key, and --format text/json/csv picks the output format.
 Or you can pass no arguments and enter interactive mode!"""
 
 SCREEN_WELCOME_HEADER = SCREEN_HELP_HEADER
@@ -67,7 +174,7 @@ Total will describe every property in any file.
 """
 
 SCREEN_MENU_HEADER = "Main Menu"
-SCREEN_MENU_TEXT = ["Add a property","Set a property","Change a property", "Remove a property","Total the properties","Set the Directory", "Clear any set directory", "Quit"]
+SCREEN_MENU_TEXT = ["Add a property","Set a property","Change a property", "Remove a property","Total the properties","Rename a property","Set the Directory", "Clear any set directory", "Quit"]
 
 SCREEN_PROPERTY_HEADER = "{0}: {1}"
 SCREEN_PROPERTY_TEXT = """Please enter a property.
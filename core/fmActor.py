@@ -1,36 +1,215 @@
+import fnmatch
+import io
 import pathlib
+from collections import Counter, defaultdict, namedtuple
 
-from utilities import wcutil
 from fmFile import FrontMatterFile
+from fmWalker import FrontMatterWalker
+from fmIndex import FrontMatterIndex
+from fmJournal import FrontMatterJournal
+from fmUndo import FrontMatterUndoLog
+from utilities.wcutil import metrics
 from fmProperty import FrontMatterProperty
+from fmFilter import compile_filter
+from fmReport import totalWriterByFormat, write_total_text
 import constants as S
+
+FrontMatterResult = namedtuple("FrontMatterResult", ("path", "name"))
+
 class FrontMatterActor:
 
-    def __init__(self, directory, property_text, type):
+    def __init__(self, directory, property_text, type, use_index=True, jobs=1, session=None, where=None):
         self.directory = directory
         self.directory_path = pathlib.Path(self.directory)
         self.property = FrontMatterProperty(property_text)
         self.type = type
-        self.file_list = list(())
+        self.use_index = use_index
+        self.jobs = jobs
+        self.session = session
+        self.where = compile_filter(where)
+        self.mmap_threshold = FrontMatterFile.mmap_threshold
+        self.index = None
+        self.journaled = False
+        self.resume = False
+        self.journal = None
+        self.keep_undo = False
+        self.undo_log = None
+        self.file_count = 0
         self.affected = list(())
         self.summery_frame = "{0} files printed: \n"
 
     def run(self):
-        # Get file list
-        for file in self.directory_path.iterdir():
-            if wcutil.tail_matches_token(file.name, S.MD):
-                self.file_list.append(FrontMatterFile(file.resolve()))
-        # for each file, run action
-        for file in self.file_list:
-            file.read()
-            if self.action(file):
-                self.affected.append(file)
-            file.write()
+        # Notes flow through discover -> read -> act -> write -> record one at
+        # a time, so only the note in hand (or one chunk per worker) is held.
+        metrics.start()
+        if self.session:
+            self.index = self.session.begin()
+        elif self.use_index:
+            self.index = FrontMatterIndex(self.directory_path).open()
+        try:
+            if self.journaled:
+                self.journal = FrontMatterJournal(self.directory_path, self.signature()).open(self.resume)
+            if self.keep_undo:
+                self.undo_log = FrontMatterUndoLog(self.directory_path)
+            file_paths = self.discover()
+            if self.jobs > 1:
+                # Only parallel runs pay for importing multiprocessing.
+                from fmPool import FrontMatterPool
+                FrontMatterPool(self, self.jobs).run(file_paths)
+            else:
+                for file, affected in self.write(self.act(self.read(file_paths))):
+                    self.record(file, affected)
+            if self.index:
+                self.index.prune()
+            if self.journal:
+                self.journal.finish()
+            if self.undo_log:
+                self.undo_log.prune()
+        finally:
+            if self.journal:
+                self.journal.close()
+            if self.session:
+                self.session.end()
+            elif self.index:
+                self.index.close()
+            metrics.stop()
+
+    def discover(self):
+        # Notes the index can answer are recorded here and go no further.
+        watched = self.session.note_paths() if self.session else None
+        if watched is None:
+            folder_cache = self.session.folders if self.session else None
+            watched = FrontMatterWalker(self.directory_path, folder_cache=folder_cache)
+        walker = iter(watched)
+        while True:
+            started = metrics.clock()
+            file_path = next(walker, None)
+            metrics.add_time(S.PHASE_DISCOVER, started)
+            if file_path is None:
+                return
+            metrics.count(S.COUNT_DISCOVERED)
+            if self.journal and self.visit_journaled(file_path):
+                continue
+            started = metrics.clock()
+            indexed = self.visit_indexed(file_path)
+            metrics.add_time(S.PHASE_INDEX, started)
+            if not indexed:
+                yield file_path
+
+    def read(self, file_paths):
+        for file_path in file_paths:
+            file = FrontMatterFile(file_path)
+            file.mmap_threshold = self.mmap_threshold
+            file.undo_log = self.undo_log
+            file.started = metrics.clock()
+            try:
+                file.read()
+            except FileNotFoundError:
+                self.forget_vanished(file_path)
+                continue
+            yield file
+
+    def act(self, files):
+        for file in files:
+            started = metrics.clock()
+            affected = self.apply(file)
+            metrics.add_time(S.PHASE_ACT, started)
+            yield file, affected
+
+    def write(self, acted_files):
+        for file, affected in acted_files:
+            if file.modified:
+                file.write()
+                metrics.count(S.COUNT_CHANGED)
+            if self.index:
+                self.index.store(file)
+            file.clear()
+            metrics.add_item(file.path, file.started)
+            yield file, affected
+
+    def visit_indexed(self, file_path):
+        # Try the action on the indexed properties first; the note is
+        # only opened if the action would actually change it.
+        try:
+            cached = self.index.lookup(file_path) if self.index else None
+        except FileNotFoundError:
+            self.forget_vanished(file_path)
+            return True
+        if cached is None:
+            return False
+        file = FrontMatterFile(file_path)
+        affected = file.load_properties(cached) and self.apply(file)
+        if file.modified:
+            return False
+        metrics.count(S.COUNT_SKIPPED)
+        self.record(file, affected)
+        return True
+
+    def forget_vanished(self, file_path):
+        # A note deleted since it was listed, before a watcher saw it go, is
+        # skipped and dropped from the index and the watched notes.
+        if self.index:
+            self.index.forget(file_path)
+        if self.session and self.session.notes is not None:
+            self.session.notes.discard(pathlib.Path(file_path))
+
+    def visit_journaled(self, file_path):
+        # A resumed run takes what the earlier run did to a finished note from the journal.
+        affected = self.journal.lookup(file_path)
+        if affected is None:
+            return False
+        metrics.count(S.COUNT_RESUMED)
+        file_path = pathlib.Path(file_path)
+        self.record(FrontMatterResult(file_path, file_path.name), self.decode(affected, None))
+        return True
+
+    def merge(self, result):
+        # Takes a (path, affected, property lines) record from a worker.
+        file_path, affected, property_lines = result
+        file = FrontMatterFile(file_path).load_properties(property_lines)
+        self.record(file, self.decode(affected, file))
+        if self.index:
+            self.index.store(file)
+
+    def encode(self, affected):
+        return affected
+
+    def decode(self, affected, file):
+        return affected
+
+    def __getstate__(self):
+        # Worker processes need the operation, not the state of the run.
+        state = self.__dict__.copy()
+        state.update(index=None, session=None, journal=None, file_count=0, affected=list(()))
+        return state
+
+    def signature(self):
+        # Describes the operation, so a journal is only resumed by the same one.
+        return {"mode": self.type, "property": str(self.property), "where": str(self.where) if self.where else None}
+
+    def apply(self, file):
+        # Notes outside the WHERE clause are left as they are, so they are never written.
+        if self.where and not self.where.matches(file):
+            return self.unmatched()
+        return self.action(file)
+
+    def unmatched(self):
+        return False
 
     def action(self, file):
         print(S.FRAME_PLAIN_ACTION.format(self.type, self.property, file.name))
         return True
 
+    def record(self, file, affected):
+        # Only a small result is kept, so the file itself can be released.
+        self.file_count += 1
+        metrics.count(S.COUNT_SCANNED)
+        metrics.tick(S.COUNT_SCANNED, S.COUNT_DISCOVERED)
+        if affected:
+            self.affected.append(FrontMatterResult(file.path, file.name))
+        if self.journal:
+            self.journal.complete(file.path, self.encode(affected))
+
     def summarize(self):
         summary_string = self.summarize_short() + S.NL
         for affected_file in self.affected:
@@ -55,25 +234,116 @@ class FrontMatterActor_REMOVE(FrontMatterActor):
     def action(self, file):
         return file.remove_property(self.property)
 
+class FrontMatterActor_RENAME(FrontMatterActor):
+    # The property is "old key: new key". With merge, a note that already
+    # has the new key takes the old key's values too; otherwise it is skipped.
+    merge_existing = False
+
+    def action(self, file):
+        return file.rename_property(self.property, self.merge_existing)
+
+    def signature(self):
+        signature = FrontMatterActor.signature(self)
+        signature["merge"] = self.merge_existing
+        return signature
+
 class FrontMatterActor_TOTAL(FrontMatterActor):
-    def __init__(self,directory,property=S.FAKE_PROPERTY,type=S.MODE_TOTAL):
-        FrontMatterActor.__init__(self,directory,property,type)
-        self.total = {}
-        self.summary = S.EMPTY
+    def __init__(self,directory,property=S.FAKE_PROPERTY,type=S.MODE_TOTAL,use_index=True,jobs=1,session=None,where=None):
+        FrontMatterActor.__init__(self,directory,property,type,use_index,jobs,session,where)
+        self.key_counts = Counter()
+        self.value_counts = defaultdict(Counter)
+        self.total = defaultdict(list)
+        self.top = None
+        self.key_patterns = list(())
+        self.keep_files = False
+        self.output_format = S.FORMAT_TEXT
+
+    def set_report(self, top=None, key_patterns=None, keep_files=False, output_format=S.FORMAT_TEXT):
+        self.top = top
+        self.key_patterns = key_patterns or list(())
+        self.keep_files = keep_files
+        self.output_format = output_format
+        return self
 
     def action(self, file):
-        for file_property in file.properties:
-            if file_property.key in self.total:
-                self.total[file_property.key].append(file.name)
-            else:
-                self.total[file_property.key] = list((file.name,))
+        for file_property in file.properties.values():
+            key = file_property.key
+            if key is None:
+                continue
+            if self.key_patterns and not any(fnmatch.fnmatchcase(key, pattern) for pattern in self.key_patterns):
+                continue
+            self.key_counts[key] += 1
+            self.value_counts[key].update(file_property.values())
+            if self.keep_files:
+                self.total[key].append(file.name)
         return True
 
-    def run(self):
-        FrontMatterActor.run(self)
-        self.summary = S.FRAME_PROPERTIES_IN.format(self.directory.resolve()) + '\n'
-        for key in sorted(self.total.keys()):
-            self.summary = self.summary + S.FRAME_PROPERTY.format(key, str(self.total[key])) + '\n'
+    def decode(self, affected, file):
+        # Totals are gathered in this process, from the worker's property lines.
+        return self.apply(file)
+
+    def __getstate__(self):
+        state = FrontMatterActor.__getstate__(self)
+        state.update(key_counts=Counter(), value_counts=defaultdict(Counter), total=defaultdict(list))
+        return state
+
+    def files_for(self, key):
+        # Sorted, since the walker hands notes over in the order its threads finish them.
+        self.total[key].sort()
+        return self.total[key]
+
+    def top_values(self, key):
+        # Ties are broken by value, so the report does not depend on walk order.
+        values = sorted(self.value_counts[key].items(), key=lambda item: (-item[1], item[0]))
+        return values[:self.top] if self.top else values
+
+    def write_summary(self, stream):
+        totalWriterByFormat[self.output_format](self, stream)
+
+    @property
+    def summary(self):
+        text = io.StringIO()
+        write_total_text(self, text)
+        return text.getvalue()
+
+class FrontMatterActor_BATCH(FrontMatterActor):
+    # Applies an ordered list of operations to each note during one walk,
+    # so every note is read once and written at most once.
+    def __init__(self, directory, operations, type=S.MODE_BATCH, use_index=True, jobs=1, session=None, where=None):
+        FrontMatterActor.__init__(self, directory, S.FAKE_PROPERTY, type, use_index, jobs, session, where)
+        self.actors = list(())
+        for operation_type, property_text in operations:
+            if operation_type not in batchTypes:
+                raise ValueError(S.ERROR_INVALID_BATCH_COMMAND.format(operation_type))
+            self.actors.append(create_actor(directory, property_text, operation_type, False))
+
+    def action(self, file):
+        return [actor for actor in self.actors if actor.action(file)]
+
+    def unmatched(self):
+        return list(())
+
+    def encode(self, affected):
+        return [self.actors.index(actor) for actor in affected]
+
+    def decode(self, affected, file):
+        return [self.actors[position] for position in affected]
+
+    def record(self, file, affected):
+        FrontMatterActor.record(self, file, affected)
+        for actor in affected:
+            actor.affected.append(self.affected[-1])
+
+    def signature(self):
+        signature = FrontMatterActor.signature(self)
+        signature["operations"] = [[actor.type, str(actor.property)] for actor in self.actors]
+        return signature
+
+    def summarize(self):
+        summary_string = self.summarize_short() + S.NL
+        for actor in self.actors:
+            summary_string += S.FRAME_BATCH_OPERATION.format(actor.type, actor.property, actor.summarize())
+        return summary_string
 
 
 actorByType = {
@@ -81,7 +351,38 @@ actorByType = {
     S.MODE_SET: FrontMatterActor_SET,
     S.MODE_CHANGE: FrontMatterActor_CHANGE,
     S.MODE_REMOVE: FrontMatterActor_REMOVE,
-    S.MODE_TOTAL: FrontMatterActor_TOTAL
+    S.MODE_TOTAL: FrontMatterActor_TOTAL,
+    S.MODE_RENAME: FrontMatterActor_RENAME
 }
-def create_actor(directory,property_text,type):
-    return actorByType[type](directory, property_text, type)
\ No newline at end of file
+batchTypes = (S.MODE_ADD, S.MODE_SET, S.MODE_CHANGE, S.MODE_REMOVE, S.MODE_RENAME)
+def create_actor(directory,property_text,type,use_index=True,jobs=1,session=None,where=None):
+    return actorByType[type](directory, property_text, type, use_index, jobs, session, where)
+def create_batch_actor(directory,operations,use_index=True,jobs=1,session=None,where=None):
+    return FrontMatterActor_BATCH(directory, operations, S.MODE_BATCH, use_index, jobs, session, where)
+
+def property_error(type, property_text):
+    """
+    Checks the [Key]:[Value] text given to an operation, the same way for
+    the command line and for daemon and SERVE commands.
+    :return: The error to show, or None if the text can be used
+    """
+    if not isinstance(property_text, str):
+        return S.ERROR_INVALID_PROPERTY
+    property_split = property_text.split(S.COLON)
+    if len(property_split) < 2:
+        return S.ERROR_INVALID_PROPERTY
+    if type == S.MODE_RENAME and (len(property_split) != 2 or not property_split[0].strip() or not property_split[1].strip()):
+        return S.ERROR_INVALID_RENAME
+    return None
+
+def batch_error(operations):
+    """
+    Checks the (type, property text) operations of a batch.
+    :return: The error to show, or None if the batch can be run
+    """
+    if not operations:
+        return S.ERROR_INVALID_BATCH
+    for type, property_text in operations:
+        if type not in batchTypes or property_error(type, property_text):
+            return S.ERROR_INVALID_BATCH
+    return None
\ No newline at end of file
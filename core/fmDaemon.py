@@ -0,0 +1,181 @@
+import io
+import json
+import os
+import pathlib
+import signal
+import socket
+import socketserver
+
+from fmActor import actorByType, batch_error, create_actor, create_batch_actor, property_error
+from fmFilter import compile_filter
+from fmReport import total_data, totalWriterByFormat
+from fmSession import FrontMatterSession
+from fmWatch import FrontMatterWatcher
+import constants as S
+
+
+def socket_path_for(directory):
+    return pathlib.Path(directory) / S.WATCH_SOCKET
+
+
+def command_error(command):
+    """
+    Checks the fields of a command that do not depend on its mode, since
+    they arrive as any JSON value.
+    :return: The error to reply with, or None if the fields can be used
+    """
+    directory = command.get("directory")
+    if directory is not None and not isinstance(directory, str):
+        return S.ERROR_INVALID_DIRECTORY
+    where = command.get("where")
+    if where is not None and not isinstance(where, str):
+        return S.ERROR_INVALID_FILTER.format(where)
+    top = command.get("top")
+    if top is not None and (type(top) is not int or top < 1):
+        return S.ERROR_INVALID_OPTION.format("top", top)
+    output_format = command.get("format", S.FORMAT_TEXT)
+    if not isinstance(output_format, str) or output_format.lower() not in totalWriterByFormat:
+        return S.ERROR_INVALID_OPTION.format("format", output_format)
+    keys = command.get("keys")
+    if keys is not None and (not isinstance(keys, list) or not all(isinstance(key, str) for key in keys)):
+        return S.ERROR_INVALID_OPTION.format("keys", keys)
+    operations = command.get("operations")
+    if operations is not None and (not isinstance(operations, list) or not operations or not all(
+            isinstance(operation, list) and len(operation) == 2 and all(isinstance(part, str) for part in operation)
+            for operation in operations)):
+        return S.ERROR_INVALID_BATCH
+    return None
+
+
+def run_command(session, command):
+    """
+    Runs one command against a warm session. A command is a dict such as
+    {"mode": "SET", "property": "status: done"}, {"mode": "RENAME",
+    "property": "date: created", "merge": true}, {"mode": "BATCH",
+    "operations": [["ADD", "tags: x"], ...]} or {"mode": "TOTAL", "top": 3,
+    "keys": ["tag*"], "files": false, "format": "json"}, each with an
+    optional "where" filter, and edits with an optional "undo": false to
+    skip the undo log.
+    :return: A reply dict, with "ok" and either the run's results or an "error".
+    Results give the files scanned, the names and vault-relative paths of
+    the affected files, a text report, and for TOTAL the totals as data.
+    """
+    mode = str(command.get("mode", S.EMPTY)).strip().upper()
+    directory = command.get("directory")
+    if directory is not None and not session.holds(directory):
+        return {"ok": False, "error": S.ERROR_WATCH_DIRECTORY.format(directory, session.directory)}
+    error = command_error(command)
+    if error:
+        return {"ok": False, "error": error}
+    try:
+        where = compile_filter(command.get("where"))
+    except ValueError as error:
+        return {"ok": False, "error": str(error)}
+    if mode == S.MODE_BATCH:
+        operations = [(operation[0].upper(), operation[1]) for operation in command.get("operations") or list(())]
+        error = batch_error(operations)
+        if error:
+            return {"ok": False, "error": error}
+        actor = create_batch_actor(session.directory, operations, session=session, where=where)
+        actor.keep_undo = command.get("undo", True) is not False
+    elif mode in actorByType:
+        property_text = command.get("property", S.FAKE_PROPERTY)
+        error = property_error(mode, property_text)
+        if error:
+            return {"ok": False, "error": error}
+        actor = create_actor(session.directory, property_text, mode, session=session, where=where)
+        actor.keep_undo = mode != S.MODE_TOTAL and command.get("undo", True) is not False
+        if mode == S.MODE_RENAME:
+            actor.merge_existing = bool(command.get("merge"))
+        if mode == S.MODE_TOTAL:
+            actor.set_report(command.get("top"), command.get("keys") or list(()), bool(command.get("files")),
+                             command.get("format", S.FORMAT_TEXT).lower())
+    else:
+        return {"ok": False, "error": S.ERROR_INVALID_COMMAND}
+    with session.lock:
+        actor.run()
+    reply = {"ok": True, "mode": mode, "files": actor.file_count,
+             "affected": [result.name for result in actor.affected],
+             "paths": [pathlib.Path(result.path).relative_to(session.directory).as_posix() for result in actor.affected]}
+    if mode == S.MODE_TOTAL:
+        report = io.StringIO()
+        actor.write_summary(report)
+        reply.update(report=report.getvalue(), total=total_data(actor))
+    else:
+        reply["report"] = actor.summarize()
+    return reply
+
+
+def send_command(socket_path, command):
+    """
+    Sends one command to a running daemon.
+    :return: The daemon's reply, or None if no daemon answers at socket_path
+    """
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(str(socket_path))
+            client.sendall((json.dumps(command) + S.NL).encode(S.ENCODING))
+            with client.makefile("r", encoding=S.ENCODING) as replies:
+                reply = replies.readline()
+    except (OSError, AttributeError):
+        return None
+    return json.loads(reply) if reply else None
+
+
+def answer_line(answer, line):
+    """
+    Decodes one JSON command line, answers it, and encodes the reply.
+    :param answer: A function from a command dict to a reply dict
+    :return: The reply as one line of JSON
+    """
+    try:
+        command = json.loads(line)
+        reply = answer(command) if isinstance(command, dict) else {"ok": False, "error": S.ERROR_INVALID_COMMAND}
+    except (ValueError, OSError) as error:
+        reply = {"ok": False, "error": str(error)}
+    except Exception as error:
+        # A long-lived server outlives any one bad command.
+        reply = {"ok": False, "error": "{0}: {1}".format(type(error).__name__, error)}
+    return json.dumps(reply) + S.NL
+
+
+class FrontMatterCommandHandler(socketserver.StreamRequestHandler):
+    # Each connection sends one JSON command per line and gets one JSON reply
+    # per line, from the server's answer function.
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            self.wfile.write(answer_line(self.server.answer, line).encode(S.ENCODING))
+            self.wfile.flush()
+
+
+class FrontMatterDaemon:
+    """
+    Keeps one vault's properties in memory and answers commands over a
+    local Unix socket. A FrontMatterWatcher keeps the session current,
+    so a TOTAL reads nothing from disk and an edit opens only the notes
+    whose indexed properties it would change.
+    """
+
+    def __init__(self, directory, socket_path=None):
+        self.directory = pathlib.Path(directory)
+        self.socket_path = pathlib.Path(socket_path) if socket_path else socket_path_for(self.directory)
+
+    def serve(self):
+        if send_command(self.socket_path, {"mode": S.EMPTY}) is not None:
+            raise OSError(S.ERROR_WATCH_RUNNING.format(self.socket_path))
+        self.socket_path.unlink(missing_ok=True)
+        session = FrontMatterSession(self.directory).open()
+        watcher = FrontMatterWatcher(session).begin()
+        server = socketserver.UnixStreamServer(str(self.socket_path), FrontMatterCommandHandler)
+        server.answer = lambda command: run_command(session, command)
+        signal.signal(signal.SIGTERM, lambda number, frame: exit(0))
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            os.unlink(self.socket_path)
+            watcher.stop()
+            session.close()
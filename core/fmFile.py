@@ -1,96 +1,287 @@
-from utilities.wcutil import WoodChipperFile
-from fmProperty import FrontMatterProperty
+import copy
+import mmap
+import os
+import sys
+import tempfile
+
+from utilities.wcutil import WoodChipperFile, copy_file_tail, metrics, real_file_path, replace_file
+from fmTokenizer import rename_key, split_lines, tokenize_properties
 import constants as S
 
 
 class FrontMatterFile(WoodChipperFile):
+    # Notes of at least this many bytes are read through a memory map.
+    mmap_threshold = S.MMAP_THRESHOLD
+    # When set, write() records the header it replaces here, for UNDO.
+    undo_log = None
 
     def __init__(self, filePath):
-        WoodChipperFile.__init__(self,filePath)
-        self.properties = list(())
+        # A note is only ever edited, never created: one that vanished stays gone.
+        WoodChipperFile.__init__(self,filePath,auto_create=False)
+        self.properties = {}
+        self.repeated_keys = set(())
         self.properties_start = -1
         self.properties_end = -1
+        self.body_offset = 0
+        self.body_follows = False
+        self.modified = False
+        self.newline = S.NL
 
     def read(self):
-        WoodChipperFile.read(self)
+        # Only the header is loaded: lines stop one past the closing fence,
+        # and the body is left on disk from body_offset onwards.
+        started = metrics.clock()
+        self.text = list(())
+        self.body_offset = 0
+        self.newline = S.NL
+        with open(self.path, "rb") as note:
+            size = os.fstat(note.fileno()).st_size
+            if size and size >= self.mmap_threshold:
+                with mmap.mmap(note.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    self.read_mapped(mapped, size)
+            else:
+                self.read_lines(note)
+        metrics.count(S.COUNT_BYTES_READ, self.body_offset)
+        metrics.add_time(S.PHASE_READ, started)
+        started = metrics.clock()
         self.find_properties()
+        metrics.add_time(S.PHASE_PARSE, started)
+
+    def read_lines(self, note):
+        fence_count = 0
+        for raw_line in note:
+            line = raw_line.decode(S.ENCODING)
+            self.text.append(line)
+            self.body_offset += len(raw_line)
+            if fence_count == 2:
+                break
+            if is_fence(line) and (fence_count or len(self.text) == 1):
+                fence_count += 1
+            elif not fence_count:
+                break
+
+    def read_mapped(self, mapped, size):
+        # For very large notes: the fences are found with mmap.find, only
+        # the header is decoded, and the body is never split into lines.
+        # The line after the closing fence is only kept if it is blank;
+        # otherwise body_follows says the body starts with text.
+        first_end = line_end(mapped, 0, size)
+        # Taken here, since a note without a header leaves no lines to take it from.
+        if mapped[max(first_end-2, 0):first_end] == S.CRLF.encode(S.ENCODING):
+            self.newline = S.CRLF
+        if not is_mapped_fence(mapped, 0, first_end):
+            self.body_follows = not is_blank(mapped, 0, first_end)
+            return
+        search = first_end - 1
+        while True:
+            search = mapped.find(b"\n" + S.FM.encode(S.ENCODING), search)
+            if search < 0:
+                # An unclosed block is not frontmatter, as in read_lines.
+                self.body_follows = True
+                return
+            fence_end = line_end(mapped, search+1, size)
+            if is_mapped_fence(mapped, search+1, fence_end):
+                break
+            search += 1
+        self.body_offset = fence_end
+        if fence_end < size:
+            next_end = line_end(mapped, fence_end, size)
+            if is_blank(mapped, fence_end, next_end):
+                self.body_offset = next_end
+            else:
+                self.body_follows = True
+        self.text = split_lines(mapped[:self.body_offset].decode(S.ENCODING))
 
     def find_properties(self):
-        front_matter_indices = [index for index, line in enumerate(self.text) if S.FM in line]
+        # Lines this class builds end the way the note's first line does.
+        if self.text:
+            self.newline = S.CRLF if self.text[0].endswith(S.CRLF) else S.NL
+        front_matter_indices = [index for index, line in enumerate(self.text) if is_fence(line)]
+        if front_matter_indices[:1] != [0]:
+            front_matter_indices = list(())
         if len(front_matter_indices) < 2:
-            self.text.insert(0, S.FM_LINE)
-            self.text.insert(0, S.FM_LINE)
+            self.text.insert(0, S.FM + self.newline)
+            self.text.insert(0, S.FM + self.newline)
             front_matter_indices = list((0,1))
         self.properties_start = front_matter_indices[0]+1
         self.properties_end = front_matter_indices[1]
-        for line in self.text[self.properties_start:self.properties_end]:
-            if len(line) > 3:
-                self.properties.append(FrontMatterProperty(line))
+        for prop_item in tokenize_properties(self.text[self.properties_start:self.properties_end]):
+            self.keep_property(prop_item)
+
+    def load_properties(self, property_lines):
+        # Stands in for read() when the properties come from the index.
+        self.properties = {}
+        self.repeated_keys = set(())
+        for line in property_lines:
+            for prop_item in tokenize_properties(line):
+                self.keep_property(prop_item)
+        return self
+
+    def keep_property(self, prop_item):
+        # Properties are keyed in line order. A repeated key keeps its line
+        # under a surrogate key, so it is still written back while lookups
+        # find the first occurrence.
+        key = prop_item.key
+        if key is None:
+            key = (key, len(self.properties))
+        elif key in self.properties:
+            self.repeated_keys.add(key)
+            key = (key, len(self.properties))
+        self.properties[key] = prop_item
+
+    def forget_property(self, key):
+        del self.properties[key]
+        self.promote_repeated(key)
+
+    def promote_repeated(self, key):
+        if key in self.repeated_keys:
+            # The next line with the same key takes over, in its own place.
+            surrogate = next((item for item in self.properties if isinstance(item, tuple) and item[0] == key), None)
+            if surrogate is None:
+                self.repeated_keys.discard(key)
+            else:
+                self.properties = {(key if item == surrogate else item): value for item, value in self.properties.items()}
+
+    def property_lines(self):
+        return [file_property.as_line() for file_property in self.properties.values()]
 
     def write(self):
+        # The new header goes to a temp file beside the note, the body is
+        # copied across untouched, and the temp file then replaces the note.
+        # A symlinked note is replaced where it really lives, keeping the link.
+        started = metrics.clock()
         self.set_properties()
-        WoodChipperFile.write(self)
+        header = S.EMPTY.join(self.text).encode(S.ENCODING)
+        note_path = real_file_path(self.path)
+        handle, temp_path = tempfile.mkstemp(dir=note_path.parent, prefix=S.HIDDEN, suffix=S.TEMP_SUFFIX)
+        try:
+            with os.fdopen(handle, "wb") as temp_file, open(note_path, "rb") as note:
+                if self.undo_log:
+                    before = os.fstat(note.fileno())
+                    old_header = note.read(self.body_offset)
+                temp_file.write(header)
+                temp_file.flush()
+                copy_file_tail(note, temp_file, self.body_offset)
+                if metrics.is_active:
+                    metrics.count(S.COUNT_BYTES_WRITTEN, temp_file.tell())
+            replace_file(temp_path, note_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        if self.undo_log:
+            self.undo_log.record(self.path, before, os.stat(note_path), old_header, header)
+        self.body_offset = len(header)
+        self.body_follows = False
+        self.modified = False
+        metrics.add_time(S.PHASE_WRITE, started)
 
     def set_properties(self):
-        text_property_length = self.properties_end - self.properties_start
-        number_added = len(self.properties) - text_property_length
-        target_index = 0
-        for index, prop_item in enumerate(self.properties):
-            target_index = index+self.properties_start
-            if index < text_property_length:
-                self.text[target_index] = prop_item.as_line()
-            else:
-                self.text.insert(target_index, prop_item.as_line())
-        if number_added < 0:
-            target_index = target_index+1
-            to_be_removed = number_added
-            while to_be_removed != 0:
-                self.text.pop(target_index)
-                to_be_removed = to_be_removed+1
-
-        self.properties_end += number_added
-        if self.text[self.properties_end+1].strip() != S.EMPTY:
-            self.text.insert(self.properties_end+1, S.NL)
+        # The header is rebuilt in one pass: the lines before the block, the
+        # rendered properties, the closing fence, a blank line if the body
+        # starts straight after it, and then the rest of the lines untouched.
+        block = [prop_item.as_line() for prop_item in self.properties.values()]
+        if self.newline != S.NL:
+            block = [line.replace(S.CRLF, S.NL).replace(S.NL, self.newline) for line in block]
+        fence = self.text[self.properties_end:self.properties_end+1]
+        rest = self.text[self.properties_end+1:]
+        body_leads = rest[0].strip() != S.EMPTY if rest else self.body_follows
+        spacer = [self.newline] if body_leads else list(())
+        self.text = self.text[:self.properties_start] + block + fence + spacer + rest
+        self.properties_end = self.properties_start + len(block)
+
+    def mark_modified(self):
+        self.modified = True
+        return True
 
     def find_property(self,prop_item):
-        for target_property in self.properties:
-            if target_property.key == prop_item.key:
-                return target_property
-        return None
+        return self.properties.get(prop_item.key)
 
 
     def add_property_if_missing(self, prop_item):
         target_property = self.find_property(prop_item)
         if target_property:
             return False
-        self.properties.append(prop_item)
-        return True
+        self.properties[prop_item.key] = copy.copy(prop_item)
+        return self.mark_modified()
 
     def set_property_value_or_add(self, prop_item):
         target_property = self.find_property(prop_item)
         if target_property:
             if target_property.value != prop_item.value:
-                target_property.value = prop_item.value
-                return True
+                target_property.set_value(prop_item.value)
+                return self.mark_modified()
             else:
                 return False
-        self.properties.append(prop_item)
-        return True
+        self.properties[prop_item.key] = copy.copy(prop_item)
+        return self.mark_modified()
 
     def change_property_value_if_exists(self,prop_item):
         target_property = self.find_property(prop_item)
         if target_property and target_property.value != prop_item.value:
-            target_property.value = prop_item.value
-            return True
+            target_property.set_value(prop_item.value)
+            return self.mark_modified()
         return False
 
     def remove_property(self, prop_item):
         target_property = self.find_property(prop_item)
         if target_property:
-            self.properties.remove(target_property)
-            return True
+            self.forget_property(prop_item.key)
+            return self.mark_modified()
         return False
 
+    def rename_property(self, prop_item, merge=False):
+        """
+        Moves the property named by prop_item's key to the key given as
+        its value, in the same place in the block. If the new key is
+        already there, the note is left alone, or with merge, the old
+        property's values are added to the new one's and it is removed.
+        """
+        new_key = sys.intern(prop_item.value)
+        target_property = self.find_property(prop_item)
+        if not target_property or new_key == prop_item.key:
+            return False
+        existing = self.properties.get(new_key)
+        if existing is None:
+            target_property.key = new_key
+            if target_property.raw is not None:
+                target_property.raw = rename_key(target_property.raw, new_key)
+            self.properties = {(new_key if key == prop_item.key else key): value
+                               for key, value in self.properties.items()}
+            self.promote_repeated(prop_item.key)
+            return self.mark_modified()
+        if not merge:
+            return False
+        values = [value for value in existing.values() if value]
+        merged = values + [value for value in target_property.values() if value and value not in values]
+        if merged != values:
+            existing.set_value(merged[0] if len(merged) == 1 else "[" + ", ".join(merged) + "]")
+            if len(merged) > 1:
+                existing.items = merged
+        self.forget_property(prop_item.key)
+        return self.mark_modified()
+
     def incorporate_properties(self, other):
-        for other_prop in other.properties:
-            self.add_property_if_missing(other_prop)
+        for other_prop in other.properties.values():
+            if other_prop.key is not None:
+                self.add_property_if_missing(other_prop)
+
+
+def is_fence(line):
+    return line.rstrip() == S.FM
+
+
+def line_end(mapped, start, size):
+    # The offset just past the line starting at start.
+    end = mapped.find(b"\n", start)
+    return size if end < 0 else end + 1
+
+
+def is_mapped_fence(mapped, start, end):
+    # Only short lines are decoded; a fence never needs the peek window.
+    return end - start <= S.MMAP_PEEK and is_fence(mapped[start:end].decode(S.ENCODING))
+
+
+def is_blank(mapped, start, end):
+    # Lines longer than the peek window count as text.
+    return end - start <= S.MMAP_PEEK and not mapped[start:end].strip()
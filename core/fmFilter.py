@@ -0,0 +1,160 @@
+import fnmatch
+import operator
+import re
+
+import constants as S
+
+TOKEN = re.compile(r'\s*(\(|\)|(?:[^\s()"]|"[^"]*")+)')
+CONDITION = re.compile(r'^([^:!<>=]+?)(:|!=|>=|<=|>|<)(.*)$')
+GLOB_CHARACTERS = "*?["
+WIKILINK = re.compile(r"\[\[[^\[\]]*\]\]")
+comparisons = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le
+}
+
+
+class FrontMatterFilter:
+    """
+    A WHERE clause, compiled once into a predicate over a note's
+    properties. Conditions are "key" (the key exists), "key:value"
+    (equal, or a glob when the value holds * ? or [ outside of a
+    [[wikilink]], whose brackets always match as text), "key!=value", and
+    "key>value", ">=", "<", "<=" (numeric when both sides are numbers,
+    otherwise by text, which suits ISO dates). Conditions combine with
+    AND, OR, NOT and parentheses; quote values that hold spaces. A list
+    property matches when any of its items does.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = TOKEN.findall(text)
+        if not self.tokens or without_spaces(S.EMPTY.join(self.tokens)) != without_spaces(text):
+            raise ValueError(S.ERROR_INVALID_FILTER.format(text))
+        self.position = 0
+        self.predicate = self.parse_or()
+        if self.position != len(self.tokens):
+            raise ValueError(S.ERROR_INVALID_FILTER.format(text))
+        self.tokens = None
+
+    def matches(self, file):
+        values = {}
+        for file_property in file.properties.values():
+            if file_property.key is not None:
+                values.setdefault(file_property.key, list(())).extend(unquote(value) for value in file_property.values())
+        return self.predicate(values)
+
+    def __getstate__(self):
+        # Compiled predicates are closures, so worker processes compile the text again.
+        return {"text": self.text}
+
+    def __setstate__(self, state):
+        self.__init__(state["text"])
+
+    def __str__(self):
+        return self.text
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self, keyword=None):
+        token = self.peek()
+        if token is None or (keyword and token.upper() != keyword):
+            return None
+        self.position += 1
+        return token
+
+    def parse_or(self):
+        terms = [self.parse_and()]
+        while self.take(S.FILTER_OR):
+            terms.append(self.parse_and())
+        return terms[0] if len(terms) == 1 else lambda values: any(term(values) for term in terms)
+
+    def parse_and(self):
+        factors = [self.parse_not()]
+        while self.take(S.FILTER_AND):
+            factors.append(self.parse_not())
+        return factors[0] if len(factors) == 1 else lambda values: all(factor(values) for factor in factors)
+
+    def parse_not(self):
+        if self.take(S.FILTER_NOT):
+            factor = self.parse_not()
+            return lambda values: not factor(values)
+        if self.take("("):
+            inner = self.parse_or()
+            if not self.take(")"):
+                raise ValueError(S.ERROR_INVALID_FILTER.format(self.text))
+            return inner
+        token = self.take()
+        if token is None or token == ")":
+            raise ValueError(S.ERROR_INVALID_FILTER.format(self.text))
+        if token.endswith(tuple(comparisons) + (S.COLON, "!=")) and self.peek() not in (None, "(", ")") \
+                and self.peek().upper() not in (S.FILTER_AND, S.FILTER_OR, S.FILTER_NOT):
+            # Written as "key: value", the way the property itself is written.
+            token += self.take()
+        return compile_condition(token)
+
+
+def compile_condition(token):
+    found = CONDITION.match(token)
+    if not found:
+        key = unquote(token)
+        return lambda values: key in values
+    key, symbol, wanted = unquote(found.group(1).strip()), found.group(2), unquote(found.group(3).strip())
+    pattern = glob_pattern(wanted) if symbol == ":" else None
+    if pattern is not None:
+        return lambda values: any(fnmatch.fnmatchcase(value, pattern) for value in values.get(key, ()))
+    if symbol == ":":
+        return lambda values: wanted in values.get(key, ())
+    if symbol == "!=":
+        return lambda values: wanted not in values.get(key, ())
+    compare = comparisons[symbol]
+    wanted_number = as_number(wanted)
+
+    def compare_values(values):
+        for value in values.get(key, ()):
+            if wanted_number is None:
+                if compare(value, wanted):
+                    return True
+            elif as_number(value) is not None and compare(as_number(value), wanted_number):
+                return True
+        return False
+    return compare_values
+
+
+def glob_pattern(wanted):
+    """
+    :return: An fnmatch pattern for wanted, with the brackets of any
+    [[wikilink]] escaped, or None if wanted holds no glob syntax
+    """
+    # Wildcards count inside a link too, as in [[Proj*]]; a bracket does not.
+    if not any(character in wanted for character in GLOB_CHARACTERS if character != "[") \
+            and "[" not in WIKILINK.sub(S.EMPTY, wanted):
+        return None
+    return WIKILINK.sub(lambda link: link.group(0).replace("[", "[[]"), wanted)
+
+
+def without_spaces(text):
+    return re.sub(r"\s", S.EMPTY, text)
+
+
+def as_number(text):
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def unquote(text):
+    if len(text) > 1 and text[0] == text[-1] and text[0] in "\"'":
+        return text[1:-1]
+    return text
+
+
+def compile_filter(where):
+    # Accepts WHERE text or an already compiled filter.
+    if not isinstance(where, str):
+        return where
+    return FrontMatterFilter(where)
@@ -0,0 +1,114 @@
+import json
+import os
+import pathlib
+import sqlite3
+
+import constants as S
+
+
+class FrontMatterIndex:
+    """
+    A persistent map from each note in a vault to the (mtime_ns, size,
+    properties) it had when it was last parsed, kept in a SQLite file
+    at the vault root. Entries are trusted only while the note's
+    mtime and size still match, unless verify is turned off by a
+    watcher that refreshes entries itself as notes change.
+    """
+
+    def __init__(self, directory):
+        self.directory = pathlib.Path(directory)
+        self.path = self.directory / S.INDEX_NAME
+        self.connection = None
+        self.entries = {}
+        self.updates = {}
+        self.seen = set(())
+        self.verify = True
+
+    def open(self):
+        try:
+            self.connection = self.connect()
+        except sqlite3.DatabaseError:
+            # A damaged index is only a cache, so start it again.
+            self.path.unlink(missing_ok=True)
+            self.connection = self.connect()
+        return self
+
+    def connect(self):
+        # A served session's runs come from different threads, one at a
+        # time under the session's lock, so the connection is not pinned.
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute(S.INDEX_CREATE)
+        for path, mtime_ns, size, properties in connection.execute(S.INDEX_SELECT):
+            self.entries[path] = (mtime_ns, size, json.loads(properties))
+        return connection
+
+    def begin(self):
+        # Starts a new walk, for pruning, while keeping every entry loaded.
+        self.seen.clear()
+        return self
+
+    def key_for(self, file_path):
+        return pathlib.Path(file_path).relative_to(self.directory).as_posix()
+
+    def lookup(self, file_path):
+        """
+        :param file_path: The path of a note inside the vault
+        :return: The note's property lines, or None if the index has
+        no entry for it or the note changed since it was stored.
+        """
+        key = self.key_for(file_path)
+        self.seen.add(key)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if not self.verify:
+            return entry[2]
+        stat = os.stat(file_path)
+        if entry[0] != stat.st_mtime_ns or entry[1] != stat.st_size:
+            return None
+        return entry[2]
+
+    def store(self, file):
+        key = self.key_for(file.path)
+        self.seen.add(key)
+        stat = os.stat(file.path)
+        self.entries[key] = self.updates[key] = (stat.st_mtime_ns, stat.st_size, file.property_lines())
+
+    def refresh(self, file_path):
+        # Drops the note's entry if the note changed on disk since it was stored.
+        key = self.key_for(file_path)
+        entry = self.entries.get(key)
+        if entry is None:
+            return
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            stat = None
+        if stat is None or entry[0] != stat.st_mtime_ns or entry[1] != stat.st_size:
+            del self.entries[key]
+
+    def forget(self, file_path):
+        self.entries.pop(self.key_for(file_path), None)
+
+    def prune(self):
+        # Notes that were not seen during a full walk have been deleted or moved.
+        for key in set(self.entries) - self.seen:
+            del self.entries[key]
+            self.updates[key] = None
+
+    def flush(self):
+        # Saves what changed since the last flush, leaving the index open.
+        if not self.connection:
+            return
+        with self.connection:
+            self.connection.executemany(S.INDEX_DELETE, [(key,) for key, entry in self.updates.items() if entry is None])
+            self.connection.executemany(S.INDEX_UPSERT, [(key, entry[0], entry[1], json.dumps(entry[2]))
+                                                         for key, entry in self.updates.items() if entry is not None])
+        self.updates.clear()
+
+    def close(self):
+        if not self.connection:
+            return
+        self.flush()
+        self.connection.close()
+        self.connection = None
@@ -0,0 +1,78 @@
+import json
+import os
+import pathlib
+
+import constants as S
+
+
+class FrontMatterJournal:
+    """
+    An append-only record of the notes a run has finished, kept at the
+    vault root while the run is going. The first line describes the run;
+    each later line is one finished note and what the run did to it.
+    A run that completes removes its journal. A run that was cut short
+    leaves it behind, so a resumed run with the same description can
+    skip every note already listed instead of starting over.
+    """
+
+    def __init__(self, directory, signature):
+        self.directory = pathlib.Path(directory)
+        self.path = self.directory / S.JOURNAL_NAME
+        self.signature = signature
+        self.completed = {}
+        self.handle = None
+
+    def open(self, resume=False):
+        """
+        :param resume: Keep the notes finished by an earlier, interrupted
+        run of the same operation, instead of starting a new journal
+        :return: The journal, ready for complete()
+        :raises ValueError: If resuming a journal left by a different operation
+        """
+        if resume and self.path.exists():
+            self.load()
+            self.handle = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+            return self
+        self.handle = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        self.append(self.signature)
+        return self
+
+    def load(self):
+        with open(self.path, "r", encoding=S.ENCODING) as journal:
+            lines = iter(journal)
+            if json.loads(next(lines, "null")) != self.signature:
+                raise ValueError(S.ERROR_RESUME_MISMATCH.format(self.path))
+            for line in lines:
+                try:
+                    key, affected = json.loads(line)
+                except ValueError:
+                    # The last line may be torn if the run was killed while writing it.
+                    continue
+                self.completed[key] = affected
+
+    def key_for(self, file_path):
+        return pathlib.Path(file_path).relative_to(self.directory).as_posix()
+
+    def lookup(self, file_path):
+        # What an earlier run did to the note, or None if it has not finished it.
+        return self.completed.get(self.key_for(file_path)) if self.completed else None
+
+    def complete(self, file_path, affected):
+        key = self.key_for(file_path)
+        if key in self.completed:
+            return
+        self.completed[key] = affected
+        self.append([key, affected])
+
+    def append(self, entry):
+        # One unbuffered write per line, so everything written survives a kill.
+        os.write(self.handle, (json.dumps(entry) + S.NL).encode(S.ENCODING))
+
+    def close(self):
+        if self.handle is not None:
+            os.close(self.handle)
+            self.handle = None
+
+    def finish(self):
+        self.close()
+        self.path.unlink(missing_ok=True)
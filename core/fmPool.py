@@ -0,0 +1,56 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from utilities.wcutil import metrics
+import constants as S
+
+
+class FrontMatterPool:
+    """
+    Runs an actor's read, action and write steps for chunks of notes in
+    worker processes. Workers send back one small record per note, and
+    the records are handed to the actor in the order the notes were
+    submitted, so the results match a serial run.
+    """
+
+    def __init__(self, actor, jobs, chunk_size=S.JOB_CHUNK_SIZE):
+        self.actor = actor
+        self.jobs = jobs
+        self.chunk_size = chunk_size
+
+    def run(self, file_paths):
+        with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+            pending = deque(())
+            chunk = list(())
+            for file_path in file_paths:
+                chunk.append(file_path)
+                if len(chunk) == self.chunk_size:
+                    pending.append(pool.submit(run_chunk, self.actor, chunk, metrics.is_active))
+                    chunk = list(())
+                    # Keep a bounded number of chunks in flight.
+                    if len(pending) > 2*self.jobs:
+                        self.merge(pending.popleft().result())
+            if chunk:
+                pending.append(pool.submit(run_chunk, self.actor, chunk, metrics.is_active))
+            while pending:
+                self.merge(pending.popleft().result())
+
+    def merge(self, result):
+        records, snapshot = result
+        if snapshot:
+            metrics.merge(snapshot)
+        for record in records:
+            self.actor.merge(record)
+
+
+def run_chunk(actor, file_paths, collect_metrics=False):
+    # Runs in a worker process, through the read, act and write stages of
+    # the worker's own copy of the actor. The worker's metrics start from
+    # empty for each chunk and go back to the parent with the records.
+    metrics.reset()
+    metrics.is_active = collect_metrics
+    metrics.debug = None
+    records = list(())
+    for file, affected in actor.write(actor.act(actor.read(file_paths))):
+        records.append((file.path, actor.encode(affected), file.property_lines()))
+    return records, metrics.snapshot() if collect_metrics else None
@@ -1,20 +1,74 @@
+import sys
+
+from utilities.wcutil import metrics
+import constants as S
+
+
 class FrontMatterProperty:
+    # raw holds the property's lines as they were read, and is written back
+    # as-is until the value changes; only then is a line built from key and
+    # value. A verbatim entry (key None) is a line of the block that is not
+    # a property. items holds a list's entries. Keys are interned, so every
+    # note shares one string per key.
+    __slots__ = ("key", "value", "raw", "items")
+
     def __init__(self, fullPropertyText):
-        self.text = fullPropertyText
-        pieces = fullPropertyText.split(':')
-        if len(pieces) == 1 and ':' in self.text:
-            self.key = self.text.strip()
-            self.value = "false"
-        elif len(pieces) == 2:
-            self.key = pieces[0].strip()
-            self.value = pieces[1].strip()
-        else:
+        key, separator, value = fullPropertyText.partition(S.COLON)
+        if not separator:
             raise ValueError
-        self.normalise_reference()
+        self.key = sys.intern(key.strip())
+        self.value = value.strip()
+        self.raw = None
+        self.items = None
+        self.normalise()
+
+    @classmethod
+    def from_parts(cls, key, value, items=None):
+        prop_item = cls.__new__(cls)
+        prop_item.key = key if key is None else sys.intern(key)
+        prop_item.value = value
+        prop_item.raw = None
+        prop_item.items = items
+        if items is None and ("[[" in value or key[:1] == '"'):
+            prop_item.normalise()
+        return prop_item
+
+    @classmethod
+    def verbatim(cls, raw):
+        prop_item = cls.__new__(cls)
+        prop_item.key = None
+        prop_item.value = raw.strip()
+        prop_item.raw = raw
+        prop_item.items = list(())
+        return prop_item
+
+    def normalise(self):
+        if metrics.is_active:
+            started = metrics.clock()
+            self.normalise_reference()
+            metrics.add_time(S.PHASE_NORMALISE, started)
+        else:
+            self.normalise_reference()
 
     def as_line(self):
+        if self.raw is not None:
+            return self.raw
         return self.key + ": " + self.value + '\n'
 
+    def set_value(self, value):
+        self.value = value
+        self.raw = None
+        self.items = None
+
+    def add_item(self, item):
+        if self.items is None:
+            self.items = list(())
+        self.items.append(item)
+
+    def values(self):
+        # A list's entries, or the value itself.
+        return [self.value] if self.items is None else self.items
+
     def normalise_reference(self):
         if "[[" in self.value and "\"[[" not in self.value:
             first_split = self.value.split("[[")
@@ -22,13 +76,15 @@ class FrontMatterProperty:
             if len(first_split) >1:
                 after_open = first_split[1].strip()
             inside_close = after_open.split("]]")[0].strip()
-            if inside_close[0] == "\"" and inside_close[-1] == "\"":
+            if inside_close[:1] == "\"" and inside_close[-1:] == "\"":
                 inside_close = inside_close[1:-1]
             self.value = "\"[["+inside_close+"]]\""
-        if self.key[0] == '"' and self.value[-1] == '"':
+        if self.key[:1] == '"' and self.value[-1:] == '"':
             self.key = self.key[1:]
             self.value = self.value[:-1]
 
 
     def __str__(self):
-        return self.key + ": " + self.value
\ No newline at end of file
+        if self.key is None:
+            return self.value
+        return self.key + ": " + self.value
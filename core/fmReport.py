@@ -0,0 +1,58 @@
+import csv
+import json
+
+import constants as S
+
+
+def write_total_text(actor, stream):
+    stream.write(S.FRAME_PROPERTIES_IN.format(actor.directory_path.resolve()) + S.NL)
+    for key in sorted(actor.key_counts):
+        stream.write(S.SCREEN_TOTAL_TEXT.format(key, actor.key_counts[key]) + S.NL)
+        for value, count in actor.top_values(key):
+            stream.write(S.FRAME_TOTAL_VALUE.format(value, count))
+        if actor.keep_files:
+            stream.write(S.FRAME_TOTAL_FILES.format(", ".join(actor.files_for(key))))
+
+
+def write_total_json(actor, stream):
+    # Written one key at a time so the whole document is never held as a string.
+    stream.write('{{"directory": {0}, "files": {1}, "properties": {{'.format(
+        json.dumps(str(actor.directory_path.resolve())), actor.file_count))
+    for position, key in enumerate(sorted(actor.key_counts)):
+        entry = {"count": actor.key_counts[key], "values": dict(actor.top_values(key))}
+        if actor.keep_files:
+            entry["files"] = actor.files_for(key)
+        stream.write((", " if position else S.EMPTY) + json.dumps(key) + ": " + json.dumps(entry))
+    stream.write("}}" + S.NL)
+
+
+def total_data(actor):
+    # The same document as write_total_json, as a dict for callers that embed it.
+    properties = {}
+    for key in sorted(actor.key_counts):
+        properties[key] = {"count": actor.key_counts[key], "values": dict(actor.top_values(key))}
+        if actor.keep_files:
+            properties[key]["files"] = actor.files_for(key)
+    return {"directory": str(actor.directory_path.resolve()), "files": actor.file_count, "properties": properties}
+
+
+def write_total_csv(actor, stream):
+    writer = csv.writer(stream)
+    header = ["key", "key_count", "value", "value_count"]
+    if actor.keep_files:
+        header.append("files")
+    writer.writerow(header)
+    for key in sorted(actor.key_counts):
+        files = ";".join(actor.files_for(key)) if actor.keep_files else None
+        for value, count in actor.top_values(key):
+            row = [key, actor.key_counts[key], value, count]
+            if actor.keep_files:
+                row.append(files)
+            writer.writerow(row)
+
+
+totalWriterByFormat = {
+    S.FORMAT_TEXT: write_total_text,
+    S.FORMAT_JSON: write_total_json,
+    S.FORMAT_CSV: write_total_csv
+}
@@ -0,0 +1,76 @@
+import os
+import pathlib
+import signal
+import socketserver
+import threading
+
+from fmDaemon import FrontMatterCommandHandler, answer_line, run_command
+from fmSession import FrontMatterSession
+import constants as S
+
+
+class FrontMatterServer:
+    """
+    Answers JSON-lines commands for any number of vaults from one
+    long-lived process, so callers pay for interpreter start-up and a
+    cold scan once rather than once per command. A command names its
+    vault with "dir" (or "directory"), defaulting to the server's own
+    directory; each vault gets a FrontMatterSession the first time it
+    is named and keeps it warm for the rest of the process. Commands
+    are otherwise those of run_command, and so are the replies.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = pathlib.Path(directory or pathlib.Path().resolve())
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def session_for(self, directory):
+        if not isinstance(directory, (str, pathlib.PurePath)):
+            raise ValueError(S.ERROR_INVALID_DIRECTORY)
+        directory = pathlib.Path(directory).resolve()
+        if not directory.is_dir():
+            raise ValueError(S.ERROR_INVALID_DIRECTORY)
+        with self.lock:
+            session = self.sessions.get(directory)
+            if session is None:
+                session = self.sessions[directory] = FrontMatterSession(directory).open()
+            return session
+
+    def answer(self, command):
+        command = dict(command)
+        directory = command.pop("dir", None) or command.pop("directory", None) or self.directory
+        reply = run_command(self.session_for(directory), command)
+        if "id" in command:
+            # Echoed, so a caller with several commands in flight can match replies.
+            reply["id"] = command["id"]
+        return reply
+
+    def serve_stream(self, commands, replies):
+        """
+        Answers one command per line of commands, writing one reply per
+        line to replies as soon as it is ready, until commands ends.
+        """
+        for line in commands:
+            if line.strip():
+                replies.write(answer_line(self.answer, line))
+                replies.flush()
+
+    def serve_socket(self, socket_path):
+        # Each connection gets its own thread; a session's lock keeps runs on one vault in turn.
+        socket_path = pathlib.Path(socket_path)
+        socket_path.unlink(missing_ok=True)
+        server = socketserver.ThreadingUnixStreamServer(str(socket_path), FrontMatterCommandHandler)
+        server.daemon_threads = True
+        server.answer = self.answer
+        signal.signal(signal.SIGTERM, lambda number, frame: exit(0))
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            os.unlink(socket_path)
+
+    def close(self):
+        for session in self.sessions.values():
+            session.close()
+        self.sessions.clear()
@@ -0,0 +1,43 @@
+import pathlib
+import threading
+
+from fmIndex import FrontMatterIndex
+
+
+class FrontMatterSession:
+    """
+    Keeps one vault warm between the runs of an interactive session: the
+    index stays open with its entries loaded, and folder listings are kept
+    until the folder's mtime moves. Each run then only reads the notes
+    whose mtime or size changed, and only their headers are refreshed.
+    A FrontMatterWatcher can also keep notes, the set of every note in
+    the vault, so runs need not walk the folders at all.
+    """
+
+    def __init__(self, directory):
+        self.directory = pathlib.Path(directory)
+        self.index = FrontMatterIndex(self.directory)
+        self.folders = {}
+        self.notes = None
+        self.lock = threading.RLock()
+
+    def open(self):
+        self.index.open()
+        return self
+
+    def begin(self):
+        return self.index.begin()
+
+    def end(self):
+        self.index.flush()
+
+    def note_paths(self):
+        # The watched notes in a stable order, or None when nothing watches them.
+        return None if self.notes is None else sorted(self.notes)
+
+    def close(self):
+        self.index.close()
+        self.folders.clear()
+
+    def holds(self, directory):
+        return directory is not None and pathlib.Path(directory).resolve() == self.directory.resolve()
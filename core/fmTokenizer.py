@@ -0,0 +1,131 @@
+import re
+import sys
+
+from fmProperty import FrontMatterProperty
+import constants as S
+
+# Lines that start with one of these take the full match below: a list
+# item, an indented line, a quoted key, a comment, or anything else,
+# which is kept verbatim.
+LINE = re.compile(r"""
+    (?P<indent>[ \t]*)
+    (?:
+        (?P<item>-(?=[ \t\r\n]|\Z))[ \t]*(?P<item_value>[^\n]*?)
+      | (?P<key>"(?:[^"\\\n]|\\.)*"|'(?:[^'\n]|'')*'|[^\s#:"'\-][^:\n]*?)[ \t]*:[ \t]*(?P<value>[^\n]*?)
+      | [^\n]*?
+    )[ \t\r]*(?:\n|\Z)""", re.VERBOSE)
+new_property = object.__new__
+SPECIAL_STARTS = frozenset(" \t-#\"'\r\n:")
+
+
+def tokenize_properties(block):
+    """
+    Splits a frontmatter block into properties in one pass. Values may
+    hold colons, keys and values may be quoted, and block lists ("- item"
+    lines under a key) or flow lists ("[a, b]") become the property's
+    items. Indented lines stay with the property above them, and any
+    line that is not a property is kept as a verbatim entry, so the
+    block can be written back exactly as it was read.
+    :param block: The lines between the fences, or the block as a str
+    or bytes-like object
+    :return: A list of FrontMatterProperty
+    """
+    if not isinstance(block, list):
+        block = split_lines(block if isinstance(block, str) else str(block, S.ENCODING))
+    properties = list(())
+    keep = properties.append
+    special_starts = SPECIAL_STARTS
+    property_type = FrontMatterProperty
+    colon = S.COLON
+    intern = sys.intern
+    current = None
+    for line in block:
+        if line[0] not in special_starts:
+            # The common case, "key: value", needs one partition, and the
+            # line itself becomes the property's raw text.
+            key, separator, value = line.partition(colon)
+            if not separator:
+                keep(FrontMatterProperty.verbatim(line))
+                current = None
+                continue
+            current = new_property(property_type)
+            current.key = intern(key.rstrip())
+            current.value = value = value.strip()
+            current.raw = line
+            current.items = None
+            if "[" in value:
+                if is_flow_list(value):
+                    current.items = flow_items(value)
+                elif "[[" in value:
+                    current.normalise()
+            keep(current)
+            continue
+        match = LINE.match(line)
+        if current is not None and line.strip() and (match.group("indent") or match.group("item")):
+            if match.group("item"):
+                current.add_item(match.group("item_value"))
+            current.raw += line
+            continue
+        if match.group("key") is not None and not match.group("indent"):
+            value = match.group("value")
+            items = flow_items(value) if is_flow_list(value) else None
+            current = FrontMatterProperty.from_parts(unquote_key(match.group("key")), value, items)
+            current.raw = line
+            keep(current)
+        else:
+            keep(FrontMatterProperty.verbatim(line))
+            current = None
+    return properties
+
+
+def split_lines(buffer):
+    # Splits on newlines only, keeping them, so the lines join back into the buffer.
+    lines = [line + S.NL for line in buffer.split(S.NL)]
+    lines[-1] = lines[-1][:-1]
+    if not lines[-1]:
+        lines.pop()
+    return lines
+
+
+def is_flow_list(value):
+    # A wiki link, "[[Note]]", is a scalar, not a list.
+    return value[:1] == "[" and value[-1:] == "]" and value[:2] != "[["
+
+
+def flow_items(value):
+    # "[a, 'b, c', d]" -> ["a", "'b, c'", "d"]
+    inner = value[1:-1]
+    items = list(())
+    start = 0
+    quote = None
+    for position, character in enumerate(inner):
+        if quote:
+            if character == quote:
+                quote = None
+        elif character in "\"'":
+            quote = character
+        elif character == ",":
+            items.append(inner[start:position].strip())
+            start = position + 1
+    last = inner[start:].strip()
+    if last or items:
+        items.append(last)
+    return items
+
+
+def rename_key(raw, key):
+    # Swaps the key on a property's first line, keeping its value and any
+    # lines below as they were written.
+    first, newline, rest = raw.partition(S.NL)
+    match = LINE.match(first)
+    if match is None or match.group("key") is None:
+        return key + ": " + first.strip() + newline + rest
+    return key + first[match.end("key"):] + newline + rest
+
+
+def unquote_key(key):
+    if key[0] == '"':
+        return key[1:-1].replace('\\"', '"')
+    if key[0] == "'":
+        return key[1:-1].replace("''", "'")
+    return key
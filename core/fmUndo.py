@@ -0,0 +1,130 @@
+import json
+import os
+import pathlib
+import tempfile
+from datetime import datetime
+
+from utilities.wcutil import copy_file_tail, real_file_path, replace_file
+from fmTokenizer import split_lines
+import constants as S
+
+
+def undo_folder_for(directory):
+    return pathlib.Path(directory) / S.UNDO_FOLDER
+
+
+class FrontMatterUndoLog:
+    """
+    The reverse deltas of one run: for each note the run wrote, its path,
+    its mtime before the edit, its mtime and size after, and the header
+    lines before and after. Bodies are never copied, since a run only
+    ever rewrites headers. Worker processes append to the same log, one
+    whole line per write. Logs live in the vault's .frontmatter-undo
+    folder; once a run finishes, all but the newest keep are removed.
+    """
+
+    def __init__(self, directory, keep=S.UNDO_KEEP):
+        self.directory = pathlib.Path(directory)
+        self.path = undo_folder_for(self.directory) / (datetime.now().strftime(S.UNDO_NAME_FORMAT) + S.UNDO_SUFFIX)
+        self.keep = keep
+
+    def record(self, file_path, before, after, old_header, new_header):
+        """
+        :param before: The note's os.stat result before the edit
+        :param after: The note's os.stat result after the edit
+        :param old_header: The bytes the edit replaced
+        :param new_header: The bytes it wrote in their place
+        """
+        entry = {
+            "path": pathlib.Path(file_path).relative_to(self.directory).as_posix(),
+            "mtime_ns": before.st_mtime_ns,
+            "after_mtime_ns": after.st_mtime_ns,
+            "after_size": after.st_size,
+            "old": split_lines(old_header.decode(S.ENCODING)),
+            "new": split_lines(new_header.decode(S.ENCODING))
+        }
+        self.path.parent.mkdir(exist_ok=True)
+        # Opened for each entry, so worker processes hold no handle between notes.
+        handle = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(handle, (json.dumps(entry) + S.NL).encode(S.ENCODING))
+        finally:
+            os.close(handle)
+
+    def prune(self):
+        # Logs are named by start time, so the oldest sort first.
+        logs = sorted(undo_folder_for(self.directory).glob("*" + S.UNDO_SUFFIX))
+        for log_path in logs[:max(len(logs) - self.keep, 0)]:
+            log_path.unlink(missing_ok=True)
+
+
+class FrontMatterUndo:
+    """
+    Restores the headers recorded by a run's undo log, several notes at
+    a time. A note whose mtime or size moved since the run, or whose
+    header is no longer the one the run wrote, is refused and left as it
+    is. Restored notes get their pre-edit mtime back, so the logs of
+    earlier runs still match and can be undone in turn.
+    """
+
+    def __init__(self, directory, log_path=None, workers=S.UNDO_WORKERS):
+        self.directory = pathlib.Path(directory)
+        self.log_path = pathlib.Path(log_path) if log_path else self.latest_log()
+        self.workers = workers
+        self.restored = list(())
+        self.refused = list(())
+
+    def latest_log(self):
+        logs = sorted(undo_folder_for(self.directory).glob("*" + S.UNDO_SUFFIX))
+        if not logs:
+            raise ValueError(S.ERROR_UNDO_NONE.format(self.directory))
+        return logs[-1]
+
+    def run(self):
+        from concurrent.futures import ThreadPoolExecutor
+        with open(self.log_path, "r", encoding=S.ENCODING) as log:
+            entries = [json.loads(line) for line in log if line.strip()]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for entry, restored in zip(entries, pool.map(self.restore, entries)):
+                (self.restored if restored else self.refused).append(entry)
+        if self.refused:
+            # Only what could not be restored is kept, so it can be tried again.
+            with open(self.log_path, "w", encoding=S.ENCODING) as log:
+                log.writelines(json.dumps(entry) + S.NL for entry in self.refused)
+        else:
+            self.log_path.unlink()
+        return self
+
+    def restore(self, entry):
+        # A symlinked note is restored where it really lives, as it was written.
+        file_path = real_file_path(self.directory / entry["path"])
+        old_header = S.EMPTY.join(entry["old"]).encode(S.ENCODING)
+        new_header = S.EMPTY.join(entry["new"]).encode(S.ENCODING)
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return False
+        if stat.st_mtime_ns != entry["after_mtime_ns"] or stat.st_size != entry["after_size"]:
+            return False
+        handle, temp_path = tempfile.mkstemp(dir=file_path.parent, prefix=S.HIDDEN, suffix=S.TEMP_SUFFIX)
+        try:
+            with os.fdopen(handle, "wb") as temp_file, open(file_path, "rb") as note:
+                if note.read(len(new_header)) != new_header:
+                    os.unlink(temp_path)
+                    return False
+                temp_file.write(old_header)
+                temp_file.flush()
+                copy_file_tail(note, temp_file, len(new_header))
+            replace_file(temp_path, file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        os.utime(file_path, ns=(stat.st_atime_ns, entry["mtime_ns"]))
+        return True
+
+    def summarize(self):
+        summary_string = S.FRAME_UNDO_SUMMARY.format(len(self.restored), len(self.refused))
+        for entry in self.refused:
+            summary_string += S.FRAME_SUMMARY_ITEM.format(entry["path"])
+        return summary_string
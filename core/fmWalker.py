@@ -0,0 +1,83 @@
+import os
+import pathlib
+import queue
+import threading
+
+import constants as S
+
+
+class FrontMatterWalker:
+
+    def __init__(self, directory, workers=S.WALK_WORKERS, folder_cache=None):
+        self.directory = pathlib.Path(directory)
+        self.workers = workers
+        self.folder_cache = folder_cache
+
+    def walk(self):
+        # Each folder is scanned as its own task, so deep and wide vaults
+        # are listed concurrently while notes stream out to the caller.
+        # Plain threads and queues are used rather than concurrent.futures,
+        # which would add its imports to every one-shot command's start-up.
+        folders_to_scan = queue.SimpleQueue()
+        scanned = queue.SimpleQueue()
+        workers = [threading.Thread(target=self.scan_queued, args=(folders_to_scan, scanned), daemon=True)
+                   for worker in range(self.workers)]
+        for worker in workers:
+            worker.start()
+        folders_to_scan.put(self.directory)
+        pending = 1
+        try:
+            while pending:
+                result = scanned.get()
+                pending -= 1
+                if isinstance(result, BaseException):
+                    raise result
+                notes, folders = result
+                for folder in folders:
+                    folders_to_scan.put(folder)
+                    pending += 1
+                yield from notes
+        finally:
+            for worker in workers:
+                folders_to_scan.put(None)
+
+    def scan_queued(self, folders_to_scan, scanned):
+        # A worker thread: scans folders until it is handed None.
+        while True:
+            folder = folders_to_scan.get()
+            if folder is None:
+                return
+            try:
+                scanned.put(self.scan(folder))
+            except BaseException as error:
+                scanned.put(error)
+
+    def scan(self, directory):
+        # A folder's mtime only moves when entries are added, removed or
+        # renamed in it, so a cached listing stays good until it does.
+        if self.folder_cache is not None:
+            try:
+                mtime_ns = os.stat(directory).st_mtime_ns
+            except OSError:
+                return list(()), list(())
+            cached = self.folder_cache.get(directory)
+            if cached and cached[0] == mtime_ns:
+                return cached[1], cached[2]
+        notes = list(())
+        folders = list(())
+        try:
+            with os.scandir(directory) as entries:
+                for entry in sorted(entries, key=lambda e: e.name):
+                    if entry.is_dir(follow_symlinks=False):
+                        if not entry.name.startswith(S.HIDDEN):
+                            folders.append(entry.path)
+                    elif entry.name.endswith(S.MD) and entry.is_file():
+                        notes.append(pathlib.Path(entry.path))
+        except (PermissionError, FileNotFoundError, NotADirectoryError):
+            pass
+        if self.folder_cache is not None:
+            self.folder_cache[directory] = (mtime_ns, notes, folders)
+        return notes, folders
+
+    def __iter__(self):
+        return self.walk()
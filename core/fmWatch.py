@@ -0,0 +1,152 @@
+import ctypes
+import ctypes.util
+import os
+import pathlib
+import select
+import struct
+import threading
+
+import constants as S
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class Inotify:
+    """
+    A minimal ctypes binding for Linux inotify. Raises OSError or
+    AttributeError where inotify is not available.
+    """
+
+    def __init__(self):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        self.folders = {}
+
+    def add(self, folder):
+        handle = self.libc.inotify_add_watch(self.fd, os.fsencode(str(folder)), WATCH_MASK)
+        if handle >= 0:
+            self.folders[handle] = pathlib.Path(folder)
+
+    def events(self, timeout):
+        # Yields (folder, mask, name) for every event ready within timeout.
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return
+        data = os.read(self.fd, S.WATCH_BUFFER)
+        offset = 0
+        while offset < len(data):
+            handle, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset+EVENT_HEADER.size:offset+EVENT_HEADER.size+length].rstrip(b"\0")
+            offset += EVENT_HEADER.size + length
+            folder = self.folders.pop(handle, None) if mask & IN_IGNORED else self.folders.get(handle)
+            yield folder, mask, os.fsdecode(name)
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FrontMatterWatcher(threading.Thread):
+    """
+    Keeps a FrontMatterSession current while notes change on disk. With
+    inotify, each event refreshes or drops only the note it names; without
+    it, the vault is re-checked every poll_interval seconds. While the
+    watcher runs, the session lists notes and trusts its index without
+    touching the disk.
+    """
+
+    def __init__(self, session, poll_interval=S.WATCH_POLL_INTERVAL):
+        threading.Thread.__init__(self, daemon=True)
+        self.session = session
+        self.poll_interval = poll_interval
+        self.stopping = threading.Event()
+        try:
+            self.inotify = Inotify()
+        except (OSError, AttributeError):
+            self.inotify = None
+
+    def begin(self):
+        with self.session.lock:
+            self.session.notes = set(())
+            self.resync()
+            self.session.index.verify = False
+        self.start()
+        return self
+
+    def stop(self):
+        self.stopping.set()
+        self.join()
+        self.session.index.verify = True
+        self.session.notes = None
+        if self.inotify:
+            self.inotify.close()
+
+    def run(self):
+        while not self.stopping.is_set():
+            if not self.inotify:
+                self.stopping.wait(self.poll_interval)
+                with self.session.lock:
+                    self.resync()
+                continue
+            events = list(self.inotify.events(self.poll_interval))
+            if events:
+                with self.session.lock:
+                    for folder, mask, name in events:
+                        self.apply(folder, mask, name)
+
+    def resync(self):
+        # Walks the whole vault once, re-checking every note it finds.
+        found = self.add_folder(self.session.directory)
+        for file_path in self.session.notes - found:
+            self.session.index.forget(file_path)
+        self.session.notes = found
+
+    def add_folder(self, directory):
+        found = set(())
+        for folder, subfolders, names in os.walk(directory):
+            subfolders[:] = [subfolder for subfolder in subfolders if not subfolder.startswith(S.HIDDEN)]
+            if self.inotify:
+                self.inotify.add(folder)
+            for name in names:
+                if name.endswith(S.MD):
+                    file_path = pathlib.Path(folder) / name
+                    self.session.index.refresh(file_path)
+                    found.add(file_path)
+        self.session.notes |= found
+        return found
+
+    def drop_folder(self, directory):
+        for file_path in [note for note in self.session.notes if directory in note.parents]:
+            self.session.notes.discard(file_path)
+            self.session.index.forget(file_path)
+
+    def apply(self, folder, mask, name):
+        if mask & IN_Q_OVERFLOW:
+            self.resync()
+            return
+        if folder is None or not name or name.startswith(S.HIDDEN) and mask & IN_ISDIR:
+            return
+        file_path = folder / name
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                self.add_folder(file_path)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self.drop_folder(file_path)
+        elif name.endswith(S.MD):
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                self.session.notes.discard(file_path)
+                self.session.index.forget(file_path)
+            else:
+                self.session.notes.add(file_path)
+                self.session.index.refresh(file_path)
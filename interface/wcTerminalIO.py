@@ -1,8 +1,17 @@
+import os
 import pathlib
 import readline
+import shutil
+import sys
+import time
 
 screenWidth = 68
 screenBorder = '*'
+pagePrompt = "-- Page {0} of {1}: Enter for more, Q to skip the rest -- "
+pageMinimum = 5
+listingLimit = 15
+noteSuffix = ".md"
+countBudget = 0.25
 class ScreenDisplay:
     class Form:
         def __init__(self, width):
@@ -10,12 +19,13 @@ class ScreenDisplay:
             self.frame = "{0}"
             self.divider = False
 
-    def __init__(self, text, width=screenWidth, border=screenBorder, header=None, pause=False):
+    def __init__(self, text, width=screenWidth, border=screenBorder, header=None, pause=False, paged=True):
         self.text = text
         self.width = width
         self.border = border
         self.header = header
         self.pause = pause
+        self.paged = paged
         self.reply = ""
         self.cancel = False
         self.preDisplay = list(())
@@ -50,43 +60,38 @@ class ScreenDisplay:
             postFunc(self)
         return not self.cancel
     def format(self,text):
-        print()
+        # The screen is built as a list of lines and written in one go, or a
+        # page at a time when it is taller than an interactive terminal.
+        lines = [""]
         if self.header:
             if self.border:
-                print(self.form.divider)
+                lines.append(self.form.divider)
             space = self.form.width - len(self.header)
-            print(self.form.frame.format((" "*space) + self.header))
+            lines.append(self.form.frame.format((" "*space) + self.header))
         if self.border:
-            print(self.form.divider)
-        buffer = text
-        while buffer:
-            end_index = 0
-            space_index = 0
-            if len(buffer) == 0:
-                break;
-            max_length = min(self.form.width+1, len(buffer))
-            for index in range(0, max_length):
-                current = buffer[index]
-                if current == '\n':
-                    end_index = index
-                    break
-                elif current == ' ':
-                    space_index = index
-            else:
-                if index+1 == len(buffer):
-                    end_index = index+1
-                else :
-                    if buffer[index] == ' ':
-                        space_index = index
-                    end_index = space_index
-            space = (self.form.width-end_index)*' '
-            print(self.form.frame.format(buffer[:end_index] + space))
-            if(end_index+1 > len(buffer)):
-                buffer = None
-            else:
-                buffer = buffer[end_index+1:]
+            lines.append(self.form.divider)
+        width = self.form.width
+        lines.extend(self.form.frame.format(line.ljust(width)) for line in wrap_lines(text or "", width))
         if self.border:
-            print (self.form.divider)
+            lines.append(self.form.divider)
+        self.write_lines(lines)
+    def write_lines(self, lines):
+        page_size = self.page_size()
+        if not page_size or len(lines) <= page_size:
+            sys.stdout.write("\n".join(lines) + "\n")
+            sys.stdout.flush()
+            return
+        page_count = (len(lines) + page_size - 1) // page_size
+        for page, start in enumerate(range(0, len(lines), page_size), 1):
+            sys.stdout.write("\n".join(lines[start:start+page_size]) + "\n")
+            sys.stdout.flush()
+            if page < page_count and input(pagePrompt.format(page, page_count)).strip().upper()[:1] == 'Q':
+                break
+    def page_size(self):
+        # Only a terminal on both ends is paged; pipes and files get everything.
+        if not self.paged or not (sys.stdin.isatty() and sys.stdout.isatty()):
+            return None
+        return max(shutil.get_terminal_size().lines - 1, pageMinimum)
     def check_for_quit(self):
         tokens = self.reply.upper().strip()
         if len(tokens) > 0 and tokens[0] == 'Q':
@@ -180,7 +185,7 @@ class ScreenMenu(ScreenPrompt):
         self.add_validator(Create_Range_Validator(range(0, len(self.options)), -1))
 
 class ScreenDirectory():
-    def __init__(self, startingDirectoryPath=None, directoryDescription="This directory path will be used in the rest of the program."):
+    def __init__(self, startingDirectoryPath=None, directoryDescription="This directory path will be used in the rest of the program.", directoryCache=None):
 
         self.directory_path = startingDirectoryPath
         if not self.directory_path:
@@ -195,6 +200,7 @@ class ScreenDirectory():
         self.entry_text = "Please enter a directory. {0} If you simply hit enter, the chosen path will be '{1}'.".format(self.description, self.directory_path)
         self.prompt = "Please enter a Directory Path: "
         self.core_completions = { str(self.previous_path) }
+        self.directory_cache = directoryCache or sharedDirectoryCache
 
     def display(self):
         reply = self.entry_display()
@@ -209,21 +215,29 @@ class ScreenDirectory():
 
     def describe_directory(self):
         # - Current Directory
-        # - Subdirectories of current directory
+        # - Subdirectories of current directory, with the notes in each
         # - Number of files
         # - Allow hook for custom
-        prompt_frame = "Current Directory: {0}\nNumber of Files: {1}\nSubdirectories:\n{2}Once you have found the directory you wish to choose, please input 'Y'."
-        number_of_files = 0
-        self.current_completions = self.core_completions.copy()
-        subdirectory_frame = "- /{0}\n"
+        prompt_frame = "Current Directory: {0}\nNumber of Files: {1} ({2} notes)\nSubdirectories: {3}\n{4}Once you have found the directory you wish to choose, please input 'Y'."
+        listing = self.directory_cache.listing(self.directory_path)
+        self.current_completions = self.core_completions | listing.completions
+        subdirectory_frame = "- /{0} ({1}{2} notes)\n"
         subdirectory_total = ""
-        for item in pathlib.Path(self.directory_path).iterdir():
-            if item.is_dir():
-                subdirectory_total += subdirectory_frame.format(item.name)
-                self.current_completions.add("/{0}".format(item.name))
-            elif item.is_file():
-                number_of_files += 1
-        return prompt_frame.format(self.directory_path, number_of_files, subdirectory_total)
+        partial = False
+        # Only the subdirectories on screen are counted. Each gets at least
+        # its own notes; the folders below share a time budget, and what
+        # they read stays cached, so the totals fill in as the screen returns.
+        deadline = time.monotonic() + countBudget
+        for name in listing.subdirectories[:listingLimit]:
+            notes, complete = self.directory_cache.count_notes(os.path.join(listing.path, name), deadline)
+            partial = partial or not complete
+            subdirectory_total += subdirectory_frame.format(name, notes, "" if complete else "+")
+        hidden = len(listing.subdirectories) - listingLimit
+        if hidden > 0:
+            subdirectory_total += "- ... and {0} more, which Tab will complete\n".format(hidden)
+        if partial:
+            subdirectory_total += "(A + count is still being filled in; press Enter to refresh it.)\n"
+        return prompt_frame.format(self.directory_path, listing.number_of_files, listing.number_of_notes, len(listing.subdirectories), subdirectory_total)
 
 
     def confirmation_display(self):
@@ -297,6 +311,118 @@ class ScreenDirectory():
 
 
 
+class DirectoryListing():
+    """
+    One folder as the directory browser shows it, read in a single
+    os.scandir pass: entry types come from the listing itself, so no
+    entry is stat'ed unless it is a symlink.
+    """
+    def __init__(self, path, mtime_ns):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.subdirectories = list(())
+        self.note_folders = list(())
+        self.number_of_files = 0
+        self.number_of_notes = 0
+        self.completions = frozenset(())
+
+    def scan(self):
+        try:
+            with os.scandir(self.path) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        self.subdirectories.append(entry.name)
+                        # Notes are counted the way the vault walker finds them.
+                        if not entry.is_symlink() and not entry.name.startswith("."):
+                            self.note_folders.append(entry.path)
+                    elif entry.is_file():
+                        self.number_of_files += 1
+                        if entry.name.endswith(noteSuffix):
+                            self.number_of_notes += 1
+        except OSError:
+            pass
+        self.subdirectories.sort(key=str.casefold)
+        self.completions = frozenset("/{0}".format(name) for name in self.subdirectories)
+        return self
+
+class DirectoryCache():
+    """
+    Listings kept by folder and reused for as long as the folder's mtime
+    holds, which only moves when entries are added, removed or renamed in
+    it. Browsing back to a folder, or counting the notes under one again,
+    then costs a stat per folder instead of a scan.
+    """
+    def __init__(self):
+        self.listings = {}
+
+    def listing(self, path):
+        path = os.fspath(path)
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return DirectoryListing(path, None)
+        cached = self.listings.get(path)
+        if cached is None or cached.mtime_ns != mtime_ns:
+            cached = self.listings[path] = DirectoryListing(path, mtime_ns).scan()
+        return cached
+
+    def count_notes(self, path, deadline=None):
+        """
+        Counts the notes in path and every folder below it.
+        :param deadline: A time.monotonic() time after which no further
+        folders below path are read, leaving the count short
+        :return: The count, and whether every folder was counted
+        """
+        total = 0
+        pending = [os.fspath(path)]
+        while pending:
+            listing = self.listing(pending.pop())
+            total += listing.number_of_notes
+            pending.extend(listing.note_folders)
+            if pending and deadline is not None and time.monotonic() > deadline:
+                return total, False
+        return total, True
+
+sharedDirectoryCache = DirectoryCache()
+
+
+
+def wrap_lines(text, width):
+    """
+    Splits text into screen lines of at most width characters, breaking
+    long lines at their last space in reach (the space is dropped), or
+    at the edge for a word longer than width, and keeping a final line
+    of width+1. Works on offsets into each line, so the text is only
+    walked once however long it is.
+    :return: A generator of lines, without newlines or padding
+    """
+    if not text:
+        return
+    segments = text.split('\n')
+    if text.endswith('\n'):
+        segments.pop()
+    last = len(segments) - 1 if not text.endswith('\n') else -1
+    for position, segment in enumerate(segments):
+        # Only the text's very last line, with no newline after it, may
+        # run one character over the width.
+        at_end = position == last
+        limit = width+1 if at_end else width
+        start = 0
+        while True:
+            remaining = len(segment) - start
+            if remaining <= limit:
+                if remaining or not at_end or not start:
+                    yield segment[start:]
+                break
+            cut = segment.rfind(' ', start, start+width+1)
+            if cut < 0:
+                # A word longer than the screen, such as a path, is broken at the edge.
+                yield segment[start:start+width]
+                start += width
+                continue
+            yield segment[start:cut]
+            start = cut+1
+
 def Create_String_Validator(string_validator):
     def validate_to_string(screen, reply):
         return string_validator(reply)
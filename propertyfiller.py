@@ -1,9 +1,15 @@
 import sys
 import pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent / "core"))
 from utilities import wcutil
-from core.fmActor import create_actor
+from fmActor import create_actor, create_batch_actor, batchTypes, batch_error, property_error
+from fmReport import totalWriterByFormat
+from fmFilter import FrontMatterFilter
 import constants as S
-from interface import wcTerminalIO as T
+
+# A one-shot command never draws a screen or serves a socket, so the
+# terminal interface (and readline), the daemon, the server and UNDO
+# are imported by the functions that use them, not here.
 
 flag_list = None
 flags = None
@@ -19,16 +25,48 @@ class CommandLineInformation:
         self.property_value = S.EMPTY
         self.directory = None
         self.directory_text = S.EMPTY
+        self.operations = list(())
+        self.jobs = 1
+        self.top = None
+        self.keys = list(())
+        self.files = False
+        self.merge = False
+        self.resume = False
+        self.no_undo = False
+        self.format = S.FORMAT_TEXT
+        self.stats = False
+        self.stats_path = None
+        self.socket = None
+        self.where = None
+        self.mmap_above = None
         self.error = S.EMPTY
 
+def is_interactive():
+    return sys.stdin.isatty() and sys.stdout.isatty()
+
 def show_error(error):
+    # Scripts and pipes get the message on stderr, with no screen to dismiss.
+    if not is_interactive():
+        sys.stderr.write(error + "\n")
+        return
+    from interface import wcTerminalIO as T
     error_title = error.split(S.COLON)[0]
-    T.ScreenDisplay(error, header=error_title, pause=True)
+    T.ScreenDisplay(error, header=error_title, pause=True).display()
+
+def show_progress(message):
+    # Progress shares one line of stderr, so it never mixes with reports on stdout.
+    sys.stderr.write("\r" + message.ljust(S.PROGRESS_WIDTH) + ("\n" if not message else S.EMPTY))
+    sys.stderr.flush()
 
 def show_help():
-    T.ScreenDisplay(S.SCREEN_HELP_TEXT, header=S.SCREEN_HELP_HEADER, pause=True)
+    if not is_interactive():
+        sys.stdout.write(S.SCREEN_HELP_TEXT + "\n")
+        return
+    from interface import wcTerminalIO as T
+    T.ScreenDisplay(S.SCREEN_HELP_TEXT, header=S.SCREEN_HELP_HEADER, pause=True).display()
 
 def show_directory_picker():
+    from interface import wcTerminalIO as T
     directory_screen = T.ScreenDirectory()
     directory_screen.display()
     if directory_screen.success:
@@ -36,6 +74,7 @@ def show_directory_picker():
     return None
 
 def show_interactive():
+    from interface import wcTerminalIO as T
     class MenuItem:
         def __init__(self, choice, type):
             self.choice = choice
@@ -45,12 +84,14 @@ def show_interactive():
         MenuItem(S.MENU_CHOICE_SET,S.MODE_SET),
         MenuItem(S.MENU_CHOICE_CHANGE,S.MODE_CHANGE),
         MenuItem(S.MENU_CHOICE_REMOVE,S.MODE_REMOVE),
-        MenuItem(S.MENU_CHOICE_TOTAL,S.MODE_TOTAL)
+        MenuItem(S.MENU_CHOICE_TOTAL,S.MODE_TOTAL),
+        MenuItem(S.MENU_CHOICE_RENAME,S.MODE_RENAME)
     ]
     T.ScreenDisplay(S.SCREEN_WELCOME_TEXT, header=S.SCREEN_WELCOME_HEADER, pause=True).display()
     directory_path = show_directory_picker()
     menu_header = directory_path
     menu_choice = S.MENU_CHOICE_INVALID
+    session = None
     while menu_choice != S.MENU_CHOICE_QUIT:
         menu_screen = T.ScreenMenu(S.SCREEN_MENU_TEXT, header=menu_header)
         if not menu_screen.display():
@@ -70,21 +111,41 @@ def show_interactive():
                     directory_screen = T.ScreenPrompt(S.SCREEN_DIRECTORY_TEXT, header=header)
                     if directory_screen.add_validator(validate_folder).display():
                         directory = directory_screen.reply
+                if not directory:
+                    # The directory prompt was cancelled, so there is nothing to run on.
+                    menu_header = S.DIRECTORY_NONE
+                    continue
                 header = S.SCREEN_PROPERTY_HEADER.format(menu_items[menu_choice].type, str(directory))
+                session = warm_session(session, directory)
                 if menu_choice != S.MENU_CHOICE_TOTAL:
                     property_screen = T.ScreenPrompt(S.SCREEN_PROPERTY_TEXT, header=header)
                     if property_screen.add_validator(T.Create_String_Validator(lambda s: len(s.split(S.COLON)) == 2)).display():
                         reply_property = property_screen.reply.strip()
-                        actor = create_actor(directory, reply_property, menu_items[menu_choice].type)
+                        actor = create_actor(directory, reply_property, menu_items[menu_choice].type, session=session)
+                        # Menu edits are journaled and can be undone, like edits from the command line.
+                        actor.journaled = True
+                        actor.keep_undo = True
                         actor.run()
                         menu_header = actor.summarize_short()
                         T.ScreenDisplay(actor.summarize(),header=menu_header).display()
                 else:
-                    actor = create_actor(directory, S.FAKE_PROPERTY, menu_items[menu_choice].type)
+                    actor = create_actor(directory, S.FAKE_PROPERTY, menu_items[menu_choice].type, session=session)
                     actor.run()
                     T.ScreenDisplay(actor.summary, pause=True).display()
+    if session:
+        session.close()
     T.ScreenDisplay(S.SCREEN_FAREWELL_TEXT, header=S.SCREEN_FAREWELL_HEADER).display()
 
+def warm_session(session, directory):
+    # The menu keeps one vault warm at a time; choosing another directory
+    # closes the old session and starts a new one.
+    from fmSession import FrontMatterSession
+    if session and session.holds(directory):
+        return session
+    if session:
+        session.close()
+    return FrontMatterSession(directory).open()
+
 
 def format_path(path_raw):
     path = path_raw.strip()
@@ -109,6 +170,9 @@ def decipher_command_line(arguments, flags):
     """
     # Decipher the command line arguments
     cl = CommandLineInformation()
+    arguments = decipher_where(decipher_options(arguments, cl), cl)
+    if cl.error:
+        return cl
 
     if len(arguments) == 2 and arguments[1].strip().upper() == S.MODE_HELP:
         cl.success = True
@@ -120,6 +184,14 @@ def decipher_command_line(arguments, flags):
         cl.type = S.MODE_MENU
         return cl
 
+    if arguments[1].strip().upper() in (S.MODE_WATCH, S.MODE_UNDO, S.MODE_SERVE) and len(arguments) <= 3:
+        cl.type = arguments[1].strip().upper()
+        cl.directory = pathlib.Path().resolve()
+        if len(arguments) == 3:
+            return decipher_directory(arguments[2], cl)
+        cl.success = True
+        return cl
+
     if len(arguments) < 3:
         cl.error = S.ERROR_NOT_ENOUGH_ARGUMENTS
         return cl
@@ -128,31 +200,173 @@ def decipher_command_line(arguments, flags):
         cl.error = S.ERROR_INVALID_COMMAND
         return cl
 
+    if cl.type == S.MODE_BATCH:
+        return decipher_batch(arguments[2:], cl)
+
     cl.property_text = arguments[2]
-    property_split = cl.property_text.split(S.COLON)
-    if len(property_split) < 2:
-        cl.error = S.ERROR_INVALID_PROPERTY
+    cl.error = property_error(cl.type, cl.property_text) or S.EMPTY
+    if cl.error:
         return cl
+    property_split = cl.property_text.split(S.COLON)
     cl.property_key = property_split[0].strip()
     cl.property_value = property_split[1].strip()
 
     cl.directory = pathlib.Path().resolve()
 
     if len(arguments) > 3:
-        cl.directory_text = format_path(arguments[3])
-        if wcutil.valid_directory_at(pathlib.Path(cl.directory_text)):
-            cl.directory = pathlib.Path(cl.directory_text)
+        decipher_directory(arguments[3], cl)
+        return cl
+    cl.success = True
+    return cl
+
+def decipher_options(arguments, cl):
+    """
+    Pulls any --option arguments, as "--option value" or "--option=value",
+    out of the command line and stores their values on cl.
+    :return: The remaining positional arguments
+    """
+    positional = list(())
+    index = 0
+    while index < len(arguments):
+        name, equals, value = arguments[index].partition("=")
+        if name in flagOptions and not equals:
+            setattr(cl, flagOptions[name], True)
+        elif name not in valueOptions:
+            positional.append(arguments[index])
+        else:
+            if not equals:
+                index += 1
+                value = arguments[index] if index < len(arguments) else S.EMPTY
+            attribute, convert = valueOptions[name]
+            try:
+                setattr(cl, attribute, convert(value))
+            except ValueError:
+                cl.error = S.ERROR_INVALID_OPTION.format(name, value)
+                return positional
+        index += 1
+    return positional
+
+def decipher_where(arguments, cl):
+    """
+    Splits a trailing "WHERE [filter]" off the command line and compiles
+    the filter onto cl.
+    :return: The arguments before WHERE
+    """
+    for index, argument in enumerate(arguments[2:], 2):
+        if argument.strip().upper() == S.FILTER_WHERE:
+            try:
+                cl.where = FrontMatterFilter(" ".join(arguments[index+1:]))
+            except ValueError as error:
+                cl.error = str(error)
+            return arguments[:index]
+    return arguments
+
+def positive_int(text):
+    number = int(text)
+    if number < 1:
+        raise ValueError
+    return number
+
+def key_list(text):
+    keys = [key.strip() for key in text.split(S.OPTION_LIST_SEPARATOR) if key.strip()]
+    if not keys:
+        raise ValueError
+    return keys
+
+def output_format(text):
+    if text.lower() not in totalWriterByFormat:
+        raise ValueError
+    return text.lower()
+
+valueOptions = {
+    S.OPTION_JOBS: ("jobs", positive_int),
+    S.OPTION_TOP: ("top", positive_int),
+    S.OPTION_KEYS: ("keys", key_list),
+    S.OPTION_FORMAT: ("format", output_format),
+    S.OPTION_STATS: ("stats_path", str),
+    S.OPTION_SOCKET: ("socket", str),
+    S.OPTION_MMAP: ("mmap_above", positive_int)
+}
+flagOptions = {
+    S.OPTION_FILES: "files",
+    S.OPTION_MERGE: "merge",
+    S.OPTION_RESUME: "resume",
+    S.OPTION_NO_UNDO: "no_undo",
+    S.OPTION_STATS: "stats"
+}
+
+def decipher_directory(argument, cl):
+    cl.directory_text = format_path(argument)
+    if wcutil.valid_directory_at(pathlib.Path(cl.directory_text)):
+        cl.directory = pathlib.Path(cl.directory_text)
+        cl.success = True
+    else:
+        cl.error = S.ERROR_INVALID_DIRECTORY
+    return cl
+
+def decipher_batch(arguments, cl):
+    """
+    Collects the ordered operations of a BATCH command. Each operation
+    is either a [MODE] [Key]:[Value] pair of arguments, or a file with
+    one "[MODE] [Key]:[Value]" per line. A trailing argument that is
+    neither is taken as the directory.
+    :return: The CommandLineInformation, with operations filled in
+    """
+    cl.directory = pathlib.Path().resolve()
+    index = 0
+    while index < len(arguments):
+        argument = arguments[index].strip()
+        if argument.upper() in batchTypes and index+1 < len(arguments):
+            cl.operations.append((argument.upper(), arguments[index+1]))
+            index += 2
+        elif pathlib.Path(argument).is_file():
+            with open(argument, "r") as operations_file:
+                for line in operations_file:
+                    line = line.strip()
+                    if line and not line.startswith(S.BATCH_COMMENT):
+                        operation_type, _, property_text = line.partition(" ")
+                        cl.operations.append((operation_type.upper(), property_text.strip()))
+            index += 1
+        elif index+1 == len(arguments):
+            if not decipher_directory(argument, cl).success:
+                return cl
+            index += 1
         else:
-            cl.error = S.ERROR_INVALID_DIRECTORY
+            cl.error = S.ERROR_INVALID_BATCH
             return cl
-    cl.success = True
+    cl.error = batch_error(cl.operations) or S.EMPTY
+    cl.success = not cl.error
     return cl
 
+def forward_to_daemon(cl):
+    """
+    Sends the command to a WATCH daemon on cl.directory, if one is running.
+    :return: The daemon's reply, or None if the command should run here
+    """
+    if cl.jobs > 1 or cl.stats or cl.stats_path or cl.resume:
+        return None
+    socket_path = pathlib.Path(cl.socket) if cl.socket else pathlib.Path(cl.directory) / S.WATCH_SOCKET
+    if not socket_path.exists():
+        return None
+    from fmDaemon import send_command
+    command = {"mode": cl.type, "directory": str(cl.directory.resolve())}
+    if cl.where:
+        command["where"] = cl.where.text
+    if cl.type == S.MODE_BATCH:
+        command["operations"] = cl.operations
+    else:
+        command["property"] = cl.property_text
+    if cl.type == S.MODE_RENAME:
+        command["merge"] = cl.merge
+    if cl.no_undo:
+        command["undo"] = False
+    if cl.type == S.MODE_TOTAL:
+        command.update(top=cl.top, keys=cl.keys, files=cl.files, format=cl.format)
+    return send_command(socket_path, command)
+
 def _main(args):
-    flag_list = list((S.MODE_ADD, S.MODE_SET, S.MODE_CHANGE, S.MODE_REMOVE, S.MODE_TOTAL, S.MODE_HELP))
-    flags = wcutil.FlagFarm(flag_list)
-    debug = wcutil.Debug(active=True)
-    dbg = debug.scribe
+    global flag_list, flags, debug, dbg
+    flag_list = list((S.MODE_ADD, S.MODE_SET, S.MODE_CHANGE, S.MODE_REMOVE, S.MODE_TOTAL, S.MODE_RENAME, S.MODE_BATCH, S.MODE_HELP))
 
     cl = decipher_command_line(args, flags)
     if not cl.success:
@@ -162,13 +376,84 @@ def _main(args):
         show_help()
         exit(0)
     if cl.type == S.MODE_MENU:
+        flags = wcutil.FlagFarm(flag_list)
+        debug = wcutil.Debug(active=True)
+        dbg = debug.scribe
         show_interactive()
         exit(0)
+    if cl.type == S.MODE_WATCH:
+        from fmDaemon import FrontMatterDaemon
+        try:
+            FrontMatterDaemon(cl.directory, cl.socket).serve()
+        except KeyboardInterrupt:
+            exit(0)
+        except OSError as error:
+            show_error(str(error))
+            exit(1)
+    if cl.type == S.MODE_SERVE:
+        from fmServer import FrontMatterServer
+        server = FrontMatterServer(cl.directory)
+        try:
+            if cl.socket:
+                server.serve_socket(cl.socket)
+            else:
+                server.serve_stream(sys.stdin, sys.stdout)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+        exit(0)
+    if cl.type == S.MODE_UNDO:
+        from fmUndo import FrontMatterUndo
+        try:
+            undo = FrontMatterUndo(cl.directory, workers=max(cl.jobs, S.UNDO_WORKERS)).run()
+        except ValueError as error:
+            show_error(str(error))
+            exit(1)
+        print(undo.summarize())
+        exit(0)
+    reply = forward_to_daemon(cl)
+    if reply:
+        if not reply["ok"]:
+            show_error(reply["error"])
+            exit(1)
+        if cl.type == S.MODE_BATCH:
+            print(reply["report"])
+        elif cl.type == S.MODE_TOTAL:
+            sys.stdout.write(reply["report"])
+        exit(0)
+    if cl.stats or cl.stats_path:
+        wcutil.metrics.activate(wcutil.Debug(message_handler=show_progress, active=True))
+    if cl.type == S.MODE_BATCH:
+        actor = create_batch_actor(cl.directory, cl.operations, jobs=cl.jobs, where=cl.where)
     else:
-        actor = create_actor(cl.directory, cl.property_text, cl.type)
+        actor = create_actor(cl.directory, cl.property_text, cl.type, jobs=cl.jobs, where=cl.where)
+    if cl.type == S.MODE_TOTAL:
+        actor.set_report(cl.top, cl.keys, cl.files, cl.format)
+    else:
+        # Edits keep a journal, so an interrupted run can be resumed, and
+        # an undo log of the headers they replace.
+        actor.journaled = True
+        actor.resume = cl.resume
+        actor.keep_undo = not cl.no_undo
+    if cl.type == S.MODE_RENAME:
+        actor.merge_existing = cl.merge
+    if cl.mmap_above:
+        actor.mmap_threshold = cl.mmap_above
+    try:
         actor.run()
-        if cl.type == S.MODE_TOTAL:
-            print(actor.summary)
+    except ValueError as error:
+        show_error(str(error))
+        exit(1)
+    if cl.type == S.MODE_BATCH:
+        print(actor.summarize())
+    elif cl.type == S.MODE_TOTAL:
+        actor.write_summary(sys.stdout)
+    if cl.stats:
+        show_progress(S.EMPTY)
+        sys.stderr.write(wcutil.metrics.report())
+    if cl.stats_path:
+        wcutil.metrics.write_json(cl.stats_path)
 
 if __name__ == "__main__":
     _main(sys.argv)
\ No newline at end of file
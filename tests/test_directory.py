@@ -0,0 +1,41 @@
+"""
+The directory browser's note counts are bounded, and fill in from the cache.
+"""
+import pathlib
+import sys
+import tempfile
+import time
+import unittest
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT)]
+
+from interface.wcTerminalIO import DirectoryCache
+
+
+class DirectoryCountTests(unittest.TestCase):
+    def setUp(self):
+        self.scratch = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.scratch.name)
+        folder = self.root / "notes"
+        for depth in range(3):
+            folder.mkdir()
+            for position in range(2):
+                (folder / "{0}.md".format(position)).write_text("---\n---\n")
+            folder = folder / "deeper"
+
+    def tearDown(self):
+        self.scratch.cleanup()
+
+    def test_spent_budget_still_counts_the_folder_itself(self):
+        cache = DirectoryCache()
+        self.assertEqual(cache.count_notes(self.root / "notes", time.monotonic() - 1), (2, False))
+
+    def test_counts_fill_in_from_the_cache(self):
+        cache = DirectoryCache()
+        cache.count_notes(self.root / "notes", time.monotonic() - 1)
+        self.assertEqual(cache.count_notes(self.root / "notes"), (6, True))
+
+
+if __name__ == "__main__":
+    unittest.main()
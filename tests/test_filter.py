@@ -0,0 +1,55 @@
+"""
+WHERE conditions, and wikilink values in particular.
+"""
+import pathlib
+import sys
+import tempfile
+import unittest
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / "core"), str(ROOT)]
+
+from fmFile import FrontMatterFile
+from fmFilter import FrontMatterFilter
+
+
+class FilterTests(unittest.TestCase):
+    def setUp(self):
+        self.scratch = tempfile.TemporaryDirectory()
+        vault = pathlib.Path(self.scratch.name)
+        notes = {
+            "a.md": "---\nrelated: [[Note]]\nstatus: open\n---\n",
+            "b.md": "---\nrelated: \"[[Other]]\"\nstatus: done\n---\n",
+            "c.md": "---\nrelated:\n  - \"[[Note]]\"\n  - x\n---\n",
+        }
+        self.files = list(())
+        for name, text in notes.items():
+            (vault / name).write_text(text)
+            file = FrontMatterFile(vault / name)
+            file.read()
+            self.files.append(file)
+
+    def tearDown(self):
+        self.scratch.cleanup()
+
+    def matching(self, where):
+        where = FrontMatterFilter(where)
+        return [file.name for file in self.files if where.matches(file)]
+
+    def test_wikilink_value_matches_as_text(self):
+        self.assertEqual(self.matching('related:"[[Note]]"'), ["a.md", "c.md"])
+        self.assertEqual(self.matching("related:[[Note]]"), ["a.md", "c.md"])
+        self.assertEqual(self.matching("related: [[Other]]"), ["b.md"])
+        self.assertEqual(self.matching("related!=[[Note]]"), ["b.md"])
+
+    def test_wildcards_inside_a_wikilink(self):
+        self.assertEqual(self.matching("related:[[No*]]"), ["a.md", "c.md"])
+        self.assertEqual(self.matching("related:[[Oth?r]]"), ["b.md"])
+
+    def test_plain_conditions(self):
+        self.assertEqual(self.matching("status:open OR status:d*"), ["a.md", "b.md"])
+        self.assertEqual(self.matching("NOT status"), ["c.md"])
+
+
+if __name__ == "__main__":
+    unittest.main()
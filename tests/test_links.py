@@ -0,0 +1,67 @@
+"""
+Edits made through linked notes must land in the note the link names,
+and leave the link itself in place.
+"""
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+
+def run_propertyfiller(cwd, *arguments):
+    # Vault paths are passed relative to cwd: propertyfiller reads a
+    # leading "/" as relative to the working directory.
+    return subprocess.run([sys.executable, str(ROOT / "propertyfiller.py"), *arguments],
+                          cwd=cwd, capture_output=True, text=True)
+
+
+class LinkedNoteTests(unittest.TestCase):
+    def setUp(self):
+        self.scratch = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.scratch.name)
+        self.vault = self.root / "vault"
+        self.vault.mkdir()
+        self.outside = self.root / "outside"
+        self.outside.mkdir()
+
+    def tearDown(self):
+        self.scratch.cleanup()
+
+    def test_symlinked_note_edits_its_target(self):
+        real = self.outside / "real.md"
+        real.write_text("---\na: 1\n---\n\nbody\n")
+        link = self.vault / "link.md"
+        link.symlink_to(real)
+        finished = run_propertyfiller(self.root, "SET", "a: 2", "vault")
+        self.assertEqual(finished.returncode, 0, finished.stderr)
+        self.assertTrue(link.is_symlink())
+        self.assertEqual(real.read_text(), "---\na: 2\n---\n\nbody\n")
+
+    def test_hardlinked_note_stays_linked(self):
+        note = self.vault / "note.md"
+        note.write_text("---\na: 1\n---\n\nbody\n")
+        other = self.outside / "other.md"
+        os.link(note, other)
+        finished = run_propertyfiller(self.root, "SET", "a: 2", "vault")
+        self.assertEqual(finished.returncode, 0, finished.stderr)
+        self.assertTrue(os.path.samefile(note, other))
+        self.assertEqual(other.read_text(), "---\na: 2\n---\n\nbody\n")
+
+    def test_undo_restores_through_a_symlink(self):
+        real = self.outside / "real.md"
+        real.write_text("---\na: 1\n---\n\nbody\n")
+        link = self.vault / "link.md"
+        link.symlink_to(real)
+        self.assertEqual(run_propertyfiller(self.root, "SET", "a: 2", "vault").returncode, 0)
+        finished = run_propertyfiller(self.root, "UNDO", "vault")
+        self.assertEqual(finished.returncode, 0, finished.stderr)
+        self.assertTrue(link.is_symlink())
+        self.assertEqual(real.read_text(), "---\na: 1\n---\n\nbody\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+"""
+Header lines rebuilt by an edit end the way the note's lines already do.
+"""
+import pathlib
+import sys
+import tempfile
+import unittest
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / "core"), str(ROOT)]
+
+from fmActor import create_actor
+
+
+class NewlineTests(unittest.TestCase):
+    def setUp(self):
+        self.scratch = tempfile.TemporaryDirectory()
+        self.vault = pathlib.Path(self.scratch.name)
+
+    def tearDown(self):
+        self.scratch.cleanup()
+
+    def edit(self, name, content, *operations, mmap_threshold=None):
+        note = self.vault / name
+        note.write_bytes(content)
+        for mode, property_text in operations:
+            actor = create_actor(self.vault, property_text, mode, use_index=False)
+            if mmap_threshold:
+                actor.mmap_threshold = mmap_threshold
+            actor.run()
+        return note.read_bytes()
+
+    def test_crlf_note_stays_crlf(self):
+        edited = self.edit("a.md", b"---\r\ntitle: A\r\ntags:\r\n  - x\r\n---\r\nbody\r\n",
+                           ("SET", "status: done"), ("SET", "title: B"), ("RENAME", "tags: labels"))
+        self.assertEqual(edited, b"---\r\ntitle: B\r\nlabels:\r\n  - x\r\nstatus: done\r\n---\r\n\r\nbody\r\n")
+
+    def test_crlf_note_without_header_gets_crlf_header(self):
+        edited = self.edit("b.md", b"no header\r\n", ("SET", "status: done"))
+        self.assertEqual(edited, b"---\r\nstatus: done\r\n---\r\n\r\nno header\r\n")
+
+    def test_mapped_crlf_note_without_header_gets_crlf_header(self):
+        edited = self.edit("d.md", b"no header\r\nmore\r\n", ("SET", "status: done"), mmap_threshold=1)
+        self.assertEqual(edited, b"---\r\nstatus: done\r\n---\r\n\r\nno header\r\nmore\r\n")
+
+    def test_mapped_crlf_note_stays_crlf(self):
+        edited = self.edit("e.md", b"---\r\ntitle: A\r\n---\r\nbody\r\n", ("SET", "status: done"), mmap_threshold=1)
+        self.assertEqual(edited, b"---\r\ntitle: A\r\nstatus: done\r\n---\r\n\r\nbody\r\n")
+
+    def test_lf_note_stays_lf(self):
+        edited = self.edit("c.md", b"---\na: 1\n---\nbody\n", ("SET", "status: done"))
+        self.assertEqual(edited, b"---\na: 1\nstatus: done\n---\n\nbody\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
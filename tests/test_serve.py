@@ -0,0 +1,62 @@
+"""
+A SERVE process answers every command line, however malformed, and
+keeps going.
+"""
+import io
+import json
+import pathlib
+import sys
+import tempfile
+import unittest
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / "core"), str(ROOT)]
+
+from fmServer import FrontMatterServer
+
+
+class ServeStreamTests(unittest.TestCase):
+    def setUp(self):
+        self.scratch = tempfile.TemporaryDirectory()
+        self.vault = pathlib.Path(self.scratch.name)
+        (self.vault / "note.md").write_text("---\ndate: 2020\n---\n\nbody\n")
+        self.server = FrontMatterServer(self.vault)
+
+    def tearDown(self):
+        self.server.close()
+        self.scratch.cleanup()
+
+    def serve(self, *commands):
+        replies = io.StringIO()
+        self.server.serve_stream([json.dumps(command) + "\n" for command in commands], replies)
+        return [json.loads(line) for line in replies.getvalue().splitlines()]
+
+    def test_malformed_fields_are_refused(self):
+        bad = [
+            {"mode": "TOTAL", "top": "x"},
+            {"mode": "TOTAL", "top": 0},
+            {"mode": "TOTAL", "format": "xml"},
+            {"mode": "SET", "property": "a: 1", "where": 123},
+            {"mode": "BATCH", "operations": [["ADD"]]},
+            {"mode": "BATCH", "operations": "ADD"},
+            {"mode": "SET", "property": "a: 1", "dir": 5},
+        ]
+        replies = self.serve(*bad, {"mode": "TOTAL", "top": 1})
+        self.assertEqual([reply["ok"] for reply in replies], [False] * len(bad) + [True])
+
+    def test_rename_is_checked_like_the_command_line(self):
+        replies = self.serve({"mode": "RENAME", "property": "date: x: y"},
+                             {"mode": "RENAME", "property": "date:"},
+                             {"mode": "BATCH", "operations": [["RENAME", ": created"]]})
+        self.assertEqual([reply["ok"] for reply in replies], [False, False, False])
+        self.assertEqual((self.vault / "note.md").read_text(), "---\ndate: 2020\n---\n\nbody\n")
+
+    def test_batch_values_may_hold_colons(self):
+        replies = self.serve({"mode": "BATCH", "operations": [["SET", "url: https://y.com"], ["ADD", "k: v"]]})
+        self.assertEqual([reply["ok"] for reply in replies], [True])
+        self.assertEqual((self.vault / "note.md").read_text(),
+                         "---\ndate: 2020\nurl: https://y.com\nk: v\n---\n\nbody\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
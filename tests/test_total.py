@@ -0,0 +1,41 @@
+"""
+TOTAL reports are the same on every run of the same vault.
+"""
+import io
+import json
+import pathlib
+import sys
+import tempfile
+import unittest
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / "core"), str(ROOT)]
+
+from fmActor import create_actor
+import constants as S
+
+
+class TotalReportTests(unittest.TestCase):
+    def setUp(self):
+        self.scratch = tempfile.TemporaryDirectory()
+        self.vault = pathlib.Path(self.scratch.name)
+        for folder in ("c", "a", "b"):
+            (self.vault / folder).mkdir()
+            for name in ("z", "m", "a"):
+                (self.vault / folder / (folder + name + ".md")).write_text("---\nstatus: open\n---\n")
+
+    def tearDown(self):
+        self.scratch.cleanup()
+
+    def test_file_lists_are_sorted(self):
+        actor = create_actor(self.vault, S.FAKE_PROPERTY, S.MODE_TOTAL, use_index=False)
+        actor.set_report(keep_files=True, output_format=S.FORMAT_JSON).run()
+        report = io.StringIO()
+        actor.write_summary(report)
+        files = json.loads(report.getvalue())["properties"]["status"]["files"]
+        self.assertEqual(files, sorted(files))
+        self.assertEqual(len(files), 9)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+"""
+A note deleted before the watcher sees it go is skipped by the next
+command, never recreated.
+"""
+import pathlib
+import sys
+import tempfile
+import unittest
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / "core"), str(ROOT)]
+
+from fmDaemon import run_command
+from fmSession import FrontMatterSession
+from fmWatch import FrontMatterWatcher
+
+
+class VanishedNoteTests(unittest.TestCase):
+    def setUp(self):
+        self.scratch = tempfile.TemporaryDirectory()
+        self.vault = pathlib.Path(self.scratch.name)
+        (self.vault / "x.md").write_text("---\na: 1\n---\n\nx\n")
+        (self.vault / "y.md").write_text("---\na: 1\n---\n\ny\n")
+        self.session = FrontMatterSession(self.vault).open()
+        run_command(self.session, {"mode": "TOTAL"})
+
+    def tearDown(self):
+        self.session.close()
+        self.scratch.cleanup()
+
+    def run_after_unlink(self, command, poll_interval=60):
+        watcher = FrontMatterWatcher(self.session, poll_interval=poll_interval).begin()
+        try:
+            # Holding the session's lock keeps the watcher from seeing the delete first.
+            with self.session.lock:
+                (self.vault / "y.md").unlink()
+                return run_command(self.session, command)
+        finally:
+            watcher.stop()
+
+    def test_total_does_not_recreate(self):
+        reply = self.run_after_unlink({"mode": "TOTAL"})
+        self.assertTrue(reply["ok"])
+        self.assertFalse((self.vault / "y.md").exists())
+
+    def test_set_does_not_recreate(self):
+        reply = self.run_after_unlink({"mode": "SET", "property": "a: 2"})
+        self.assertTrue(reply["ok"])
+        self.assertEqual(reply["paths"], ["x.md"])
+        self.assertFalse((self.vault / "y.md").exists())
+        self.assertIsNone(self.session.index.lookup(self.vault / "y.md"))
+
+    def test_set_without_a_watcher_does_not_recreate(self):
+        (self.vault / "y.md").unlink()
+        self.session.notes = {self.vault / "x.md", self.vault / "y.md"}
+        reply = run_command(self.session, {"mode": "SET", "property": "a: 2"})
+        self.session.notes = None
+        self.assertEqual(reply["paths"], ["x.md"])
+        self.assertFalse((self.vault / "y.md").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
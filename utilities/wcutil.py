@@ -11,11 +11,14 @@ Includes:
 - Classes:_________________________________________________________
 - -- Debug class: A set of debugging tools
 - -- FlagFarm class: A simple dictionary wrapper for boolean flags
+- -- Metrics class: Phase timings, counters and progress for a run
 - -- WoodchipperFile: A simple class for reading in the lines of a
         file into an array.
 - -- WoodchipperSettingsFile: A class for handling a settings file.
 
 - Globals:_________________________________________________________
+- -- metrics: The Metrics collector shared by everything in this
+        process. Inactive, and so nearly free, until activated.
 - -- onSynonyms: A list of synonyms for true to be used when trying
         to decipher strings using str2Bool()
 - -- preferred_time_format: Our standard preferred time format as
@@ -27,10 +30,16 @@ Includes:
         green, off as red.
 - -- convert_to_array: Takes whatever is passed in an wraps it in
         a list if it wasn't already a list.
+- -- copy_file_tail: Copies everything after a byte offset in one
+        open file onto the end of another, in the kernel if possible.
 - -- decipher_command_line_arguments: Given a list of strings, this
         function checks the list for the flags of a flag farm.
 - -- process_str_array_new_lines: Given a list of strings, breaks
         up any strings with new lines into two strings.
+- -- real_file_path: Follows any symlinks in a path to the file
+        that a write through it should change.
+- -- replace_file: Moves a finished temp file over a file, keeping
+        the file's links, permissions, owner and attributes.
 - -- run_on_sorted_list: Sorts a list and then runs on each item
         a given function.
 - -- str2Bool: Converts a string to a boolean, defaulting to false,
@@ -45,7 +54,13 @@ Includes:
 - -- valid_directory_at: Returns whether the path is a directory,
         safely defaulting to False.
 """
+import heapq
+import json
+import os
 import pathlib
+import shutil
+import tempfile
+import time
 from datetime import datetime
 
 """ CLASSES ------------------------------------------------------ """
@@ -176,6 +191,143 @@ class FlagFarm:
     def has_flag(self, key):
         return key in self.keys
 
+""" Metrics
+#
+#       A class for measuring where a run spends its time. It keeps the
+#   wall time of named phases, named counters, and the slowest items
+#   seen, and can report progress through a Debug object. Like Debug,
+#   it has an internal flag: while inactive, every call returns at
+#   once, so instrumented code pays next to nothing.
+#
+### Usage
+#
+#       Instrumented code shares the module-level `metrics` object.
+#   Take a start time with clock() and hand it back to add_time()
+#   once the phase is over. Pass a Debug object to activate() to get
+#   a throttled progress line every progress_interval seconds.
+#
+#   0   started = metrics.clock()
+#   1   do_the_reading()
+#   2   metrics.add_time("read", started)
+#   3   metrics.count("bytes_read", size)
+#
+### Methods
+#
+#   # Attribute Controls
+#   activate(debug) - turns on collection, reporting progress to debug.
+#   deactivate() - turns off collection.
+#   reset() - forgets everything collected so far.
+#
+#   # Core
+#   clock() - a start time for add_time, or 0 while inactive.
+#   add_time(phase, started) - adds the time since started to phase.
+#   count(counter, amount) - adds amount to counter.
+#   add_item(name, started) - records an item for the slowest list.
+#   tick(done_counter, total_counter) - reports progress, if due.
+#
+#   # Auxiliary
+#   start() / stop() - marks the run's wall clock.
+#   snapshot() / merge(snapshot) - moves results between processes.
+#   as_dict() - the results, ready for JSON.
+#   report() - the results as readable text.
+"""
+class Metrics:
+    def __init__(self, active=False, debug=None, slowest=10, progress_interval=0.5):
+        self.is_active = active
+        self.debug = debug
+        self.slowest_count = slowest
+        self.progress_interval = progress_interval
+        self.reset()
+
+    def reset(self):
+        self.phases = {}
+        self.counters = {}
+        self.slowest = list(())
+        self.started = 0.0
+        self.finished = 0.0
+        self.last_progress = 0.0
+
+    def activate(self, debug=None):
+        self.is_active = True
+        self.debug = debug
+
+    def deactivate(self):
+        self.is_active = False
+
+    def clock(self):
+        return time.perf_counter() if self.is_active else 0.0
+
+    def add_time(self, phase, started):
+        if self.is_active:
+            self.phases[phase] = self.phases.get(phase, 0.0) + time.perf_counter() - started
+
+    def count(self, counter, amount=1):
+        if self.is_active:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def add_item(self, name, started):
+        if self.is_active:
+            entry = (time.perf_counter() - started, str(name))
+            if len(self.slowest) < self.slowest_count:
+                heapq.heappush(self.slowest, entry)
+            else:
+                heapq.heappushpop(self.slowest, entry)
+
+    def start(self):
+        self.started = self.last_progress = self.clock()
+
+    def stop(self):
+        self.finished = self.clock()
+
+    def tick(self, done_counter, total_counter):
+        if not self.is_active or not self.debug:
+            return
+        now = time.perf_counter()
+        if now - self.last_progress < self.progress_interval:
+            return
+        self.last_progress = now
+        done = self.counters.get(done_counter, 0)
+        total = self.counters.get(total_counter, 0)
+        rate = done / (now - self.started) if now > self.started else 0.0
+        eta = (total - done) / rate if rate else 0.0
+        self.debug.scribe("{0}/{1} files, {2:.0f} files/sec, ETA {3:.1f}s".format(done, total, rate, eta))
+
+    def snapshot(self):
+        return {"phases": self.phases, "counters": self.counters, "slowest": self.slowest}
+
+    def merge(self, snapshot):
+        for phase, seconds in snapshot["phases"].items():
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+        for counter, amount in snapshot["counters"].items():
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+        self.slowest = heapq.nlargest(self.slowest_count, self.slowest + snapshot["slowest"])
+        heapq.heapify(self.slowest)
+
+    def as_dict(self):
+        return {
+            "wall_seconds": self.finished - self.started,
+            "phases": self.phases,
+            "counters": self.counters,
+            "slowest": [{"seconds": seconds, "name": name} for seconds, name in sorted(self.slowest, reverse=True)],
+        }
+
+    def report(self):
+        lines = ["Run statistics: {0:.3f}s wall".format(self.finished - self.started)]
+        for counter in sorted(self.counters):
+            lines.append("  {0}: {1}".format(counter, self.counters[counter]))
+        lines.append("Phases:")
+        for phase, seconds in sorted(self.phases.items(), key=lambda item: -item[1]):
+            lines.append("  {0}: {1:.3f}s".format(phase, seconds))
+        if self.slowest:
+            lines.append("Slowest:")
+            for seconds, name in sorted(self.slowest, reverse=True):
+                lines.append("  {0:.4f}s {1}".format(seconds, name))
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path):
+        with open(path, "w") as json_file:
+            json.dump(self.as_dict(), json_file, indent=2)
+
 
 class WoodChipperFile:
 
@@ -192,15 +344,34 @@ class WoodChipperFile:
         return self.path.exists()
 
     def read(self):
+        started = metrics.clock()
         with (open(self.path, "r")
               as text_file):
             self.text = list(text_file)
+        if metrics.is_active:
+            metrics.count("bytes_read", sum(len(text_line) for text_line in self.text))
+            metrics.add_time("read", started)
 
     def write(self):
-        with (open(self.path, "w")
-              as text_file):
-            for text_line in self.text:
-                text_file.write(text_line)
+        # The lines go to a temp file beside this one, which then replaces
+        # it, so an interrupted write never leaves the file truncated. A
+        # symlink is followed, so the file it names is the one replaced.
+        started = metrics.clock()
+        file_path = real_file_path(self.path)
+        handle, temp_path = tempfile.mkstemp(dir=file_path.parent, prefix=".", suffix=".tmp")
+        try:
+            with (os.fdopen(handle, "w")
+                  as text_file):
+                for text_line in self.text:
+                    text_file.write(text_line)
+            replace_file(temp_path, file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        if metrics.is_active:
+            metrics.count("bytes_written", sum(len(text_line) for text_line in self.text))
+            metrics.add_time("write", started)
 
     def clear(self):
         self.text.clear()
@@ -332,6 +503,7 @@ onSynonyms = list(("on", "true", "1", "yes",
                    "t", "y", "+", "active",
                    "positive", "a", "p"))
 preferred_time_format = "%m%d%y:%H:%M:%S"
+metrics = Metrics()
 
 
 """ FUNCTIONS ---------------------------------------------------- """
@@ -354,6 +526,37 @@ def convert_to_array(target):
         return target
     return [target]
 
+def copy_file_tail(source, target, offset=0):
+    """
+    Copies the bytes of source from offset onwards to the current
+    position of target. Uses copy_file_range or sendfile so the
+    data never passes through Python, falling back to a block copy.
+    :param source: A file opened for binary reading
+    :param target: A file opened for binary writing, already flushed
+    :param offset: The byte offset in source to start copying from
+    :return: None
+    """
+    remaining = os.fstat(source.fileno()).st_size - offset
+    for kernel_copy in (getattr(os, "copy_file_range", None), getattr(os, "sendfile", None)):
+        if not kernel_copy or remaining <= 0:
+            continue
+        try:
+            while remaining > 0:
+                if kernel_copy is os.sendfile:
+                    copied = os.sendfile(target.fileno(), source.fileno(), offset, remaining)
+                else:
+                    copied = os.copy_file_range(source.fileno(), target.fileno(), remaining, offset)
+                if copied == 0:
+                    break
+                offset += copied
+                remaining -= copied
+            return
+        except OSError:
+            continue
+    if remaining > 0:
+        source.seek(offset)
+        shutil.copyfileobj(source, target)
+
 def decipher_command_line(arguments, flags: FlagFarm):
     """
     Deciphers the command line by parsing through arguments,
@@ -386,6 +589,55 @@ def process_str_array_new_lines(target):
     return newLines
 
 
+def real_file_path(file_path):
+    """
+    Resolves symlinks, so a temp file made beside the result and moved
+    over it edits the file a link names, rather than replacing the link.
+    :param file_path: A path that may be, or pass through, a symlink
+    :return: The resolved path, as a pathlib.Path
+    """
+    return pathlib.Path(os.path.realpath(file_path))
+
+
+def replace_file(temp_path, file_path):
+    """
+    Puts the contents of temp_path in place of file_path. The temp file
+    takes file_path's permission bits, and its owner and extended
+    attributes where the process may set them, then replaces it in one
+    step. A file with other hard links is overwritten in place instead,
+    so every link still names the new contents.
+    :param temp_path: A closed temp file in the same folder as file_path
+    :param file_path: The file to replace, with symlinks already resolved
+    :return: None
+    """
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        os.replace(temp_path, file_path)
+        return
+    if stat.st_nlink > 1:
+        with open(temp_path, "rb") as source, open(file_path, "r+b") as target:
+            copy_file_tail(source, target)
+            target.truncate()
+        os.unlink(temp_path)
+        return
+    shutil.copymode(file_path, temp_path)
+    try:
+        os.chown(temp_path, stat.st_uid, stat.st_gid)
+    except OSError:
+        pass
+    try:
+        names = os.listxattr(file_path) if hasattr(os, "listxattr") else ()
+    except OSError:
+        names = ()
+    for name in names:
+        try:
+            os.setxattr(temp_path, name, os.getxattr(file_path, name))
+        except OSError:
+            pass
+    os.replace(temp_path, file_path)
+
+
 def run_on_sorted_list(target_list, function_given_item):
     """
     Sorts the list, then runs the function on each item.